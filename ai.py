@@ -0,0 +1,204 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import NamedTuple, Iterable
+from tools import Action, Direction
+import logger
+import const
+
+
+class NPCState(NamedTuple):
+    """
+    What the AI needs to know about an NPC: plain values only,
+    so that it is cheap to send to a worker process.
+    'x' and 'y' are the center of the NPC's feet, the point its goal is compared with.
+    """
+    x: int
+    y: int
+    speed: int
+    step: int
+    tick: int
+    delay: int
+    script: list[tuple[Action, int]]
+    goal: tuple[int, int] or None = None
+    route: Direction or None = None
+
+    @classmethod
+    def of(cls, npc) -> "NPCState":
+        x, y = npc.feet.center
+        return cls(x, y, npc.speed, npc.current_step, npc.current_tick,
+                   npc.moving_steps_delay, npc.moving_script, npc.goal, npc.route)
+
+
+class Intent(NamedTuple):
+    """
+    What an NPC decided to do during a tick: the actions to take, in order,
+    and the new position of its moving script's cursor.
+    """
+    actions: tuple[Action, ...]
+    step: int
+    tick: int
+
+
+def arrived(dx: int, dy: int, speed: int) -> bool:
+    """
+    Whether an NPC moving 'speed' pixels at a time, at 'dx', 'dy' pixels from its goal, reached it.
+    """
+    return abs(dx) < speed and abs(dy) < speed
+
+
+def think(state: NPCState) -> Intent:
+    """
+    Decide what the NPC described by 'state' does during this tick.
+
+    An NPC with a moving script follows it. Otherwise, if it has a goal, it stops
+    once its feet are within its speed of the goal. Until then, it takes the direction
+    its map's navigation grid gave it (see MapTMX.steer()), or, once it is in the
+    goal's cell, walks straight to the goal.
+    """
+    step, tick = state.step, state.tick
+    script = state.script
+    actions = ()
+    if script:
+        if len(script) > step:
+            move, repeat = script[step]
+            actions = (move,) * repeat
+            step = tick = 0
+        elif tick >= state.delay:
+            tick = 0
+            step += 1
+        else:
+            tick += 1
+
+    elif state.goal is not None:
+        dx = state.goal[0] - state.x
+        dy = state.goal[1] - state.y
+        if arrived(dx, dy, state.speed):
+            pass
+        elif state.route is not None:
+            actions = (state.route,)
+        elif abs(dx) >= abs(dy) and abs(dx) >= state.speed:
+            actions = ("-right",) if dx > 0 else ("-left",)
+        elif abs(dy) >= state.speed:
+            actions = ("-down",) if dy > 0 else ("-up",)
+
+    return Intent(actions, step, tick)
+
+
+def think_batch(states: list[NPCState]) -> list[Intent]:
+    """
+    Same as think(), for a batch of NPCs. This is what runs in the worker processes.
+    """
+    return [think(state) for state in states]
+
+
+class AIStage:
+    def __init__(self, workers: int = const.AI_WORKERS, batch_size: int = const.AI_BATCH_SIZE):
+        """
+        Evaluates the AI of the NPCs whose 'ai_driven' flag is set in a pool of
+        'workers' processes (one per CPU if None), instead of in LivingEntity.update().
+
+        Every tick, self.tick() applies the intents computed from the states sent at
+        the previous tick, then sends the NPCs' current states to the workers in batches
+        of 'batch_size', so that they are evaluated while the game runs the rest of the
+        tick and draws. Intents are thus applied one tick after the states they were
+        computed from. When there are fewer NPCs than 'batch_size', they are evaluated
+        on the calling thread, which is cheaper than a round trip to another process.
+        So are all the NPCs while the workers are still starting (see self.warm_up()),
+        so that starting them never stalls a tick.
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+        self._executor: ProcessPoolExecutor or None = None
+        self._broken = False
+        self._pending: list[tuple[list, Future]] = []
+        self._warming: list[Future] = []
+
+    def _pool(self) -> ProcessPoolExecutor or None:
+        """
+        Internal method that returns the worker pool, starting it on first use.
+        """
+        if self._executor is None and not self._broken:
+            context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=context)
+        return self._executor
+
+    def warm_up(self):
+        """
+        Start the worker processes in the background, and have each of them import what it
+        needs, so that the first batches sent to the pool don't stall a tick while they do.
+        Does nothing if the pool is already started, or if one of its workers failed.
+        """
+        if self._executor is not None or self._broken:
+            return
+        pool = self._pool()
+        self._warming = [pool.submit(think_batch, []) for i in range(self.workers or os.cpu_count() or 1)]
+
+    def _ready(self) -> bool:
+        """
+        Internal method that tells whether the workers are started and can take batches,
+        starting them in the background if needed.
+        """
+        if self._executor is None:
+            self.warm_up()
+        if self._broken:
+            return False
+        if self._warming:
+            if not all(future.done() for future in self._warming):
+                return False
+            self._warming = []
+        return True
+
+    def tick(self, npcs: Iterable):
+        """
+        Apply the intents of the previous tick, and send the states of the AI-driven
+        NPCs among 'npcs' to be evaluated.
+        """
+        self.collect()
+        self.submit(npcs)
+
+    def submit(self, npcs: Iterable):
+        """
+        Send the states of the AI-driven NPCs among 'npcs' to be evaluated.
+        """
+        npcs = [npc for npc in npcs if getattr(npc, "ai_driven", False)]
+        if not npcs:
+            return
+        pool = self._executor if len(npcs) >= self.batch_size and self._ready() else None
+        for i in range(0, len(npcs), self.batch_size):
+            batch = npcs[i:i + self.batch_size]
+            states = [NPCState.of(npc) for npc in batch]
+            if pool is None:
+                future = Future()
+                future.set_result(think_batch(states))
+            else:
+                future = pool.submit(think_batch, states)
+            self._pending.append((batch, future))
+
+    def collect(self):
+        """
+        Wait for the intents of the states sent so far, and apply them to their NPCs.
+        NPCs that were killed since are ignored.
+        """
+        pending, self._pending = self._pending, []
+        for batch, future in pending:
+            try:
+                intents = future.result()
+            except Exception as error:
+                # fall back to evaluating the batch here, and stop using the pool:
+                logger.RenderThreadError.log(f"AI worker failed ({error!r}), evaluating the AI in the game's process.")
+                self._broken = True
+                self.shutdown()
+                intents = think_batch([NPCState.of(npc) for npc in batch])
+            for npc, intent in zip(batch, intents):
+                if npc.alive():
+                    npc.apply_intent(intent)
+
+    def shutdown(self):
+        """
+        Stop the worker processes. They are started again if needed, unless one of them failed.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._warming = []
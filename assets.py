@@ -0,0 +1,108 @@
+import pygame
+import os
+from os import PathLike
+from collections import OrderedDict
+import const
+
+
+class AssetManager:
+    def __init__(self, memory_budget: int):
+        """
+        A cache of the images loaded by the game, keyed by their path.
+
+        Every file is decoded only once and converted to the display's pixel format,
+        and the resulting surface is shared between all the objects that load it.
+        When the cached surfaces use more than 'memory_budget' bytes, the least
+        recently used ones are evicted.
+
+        Surfaces given by the asset manager are shared: they must never be drawn onto.
+        Copy them first if you need to modify them.
+        """
+        self.memory_budget = memory_budget
+        self._cache: OrderedDict[str, pygame.Surface] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+    @staticmethod
+    def _key(path: str or PathLike) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    @staticmethod
+    def _size_of(surface: pygame.Surface) -> int:
+        return surface.get_pitch() * surface.get_height()
+
+    @staticmethod
+    def _convert(surface: pygame.Surface) -> pygame.Surface:
+        """
+        Internal method that converts 'surface' to the display's pixel format, if a display exists.
+        """
+        if pygame.display.get_surface() is None:
+            return surface
+        if surface.get_flags() & pygame.SRCALPHA:
+            return surface.convert_alpha()
+        return surface.convert()
+
+    def load(self, path: str or PathLike) -> pygame.Surface:
+        """
+        Return the image at 'path', loading it from disk only if it is not cached yet.
+        """
+        key = self._key(path)
+        surface = self._cache.get(key)
+        if surface is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self._convert(pygame.image.load(path))
+        self._cache[key] = surface
+        self.bytes += self._size_of(surface)
+        self._evict()
+        return surface
+
+    def _evict(self):
+        """
+        Internal method that evicts the least recently used surfaces until the cache fits
+        in the memory budget. The most recently used surface is never evicted.
+        """
+        while self.bytes > self.memory_budget and len(self._cache) > 1:
+            key, surface = self._cache.popitem(last=False)
+            self.bytes -= self._size_of(surface)
+            self.evictions += 1
+
+    def forget(self, path: str or PathLike):
+        """
+        Remove the image at 'path' from the cache.
+        """
+        surface = self._cache.pop(self._key(path), None)
+        if surface is not None:
+            self.bytes -= self._size_of(surface)
+
+    def clear(self):
+        self._cache.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """
+        Return the counters of the asset manager, to monitor its efficiency.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes": self.bytes,
+            "entries": len(self._cache),
+            "budget": self.memory_budget
+        }
+
+    def __contains__(self, path: str or PathLike):
+        return self._key(path) in self._cache
+
+    def __len__(self):
+        return len(self._cache)
+
+
+asset_manager = AssetManager(const.ASSET_MEMORY_BUDGET)
+"""The game's shared asset manager."""
@@ -0,0 +1,67 @@
+import argparse
+from os import PathLike
+import mod_data
+import game
+import map
+import logger
+from tools import FrameStats
+
+
+def run_headless(ticks: int, mods: list[str] = None, map_name: str = None, warmup: int = 10,
+                 profile=False, trace: str or PathLike = None) -> FrameStats:
+    """
+    Start the game without a display, with the mods 'mods' (all the installed mods if None),
+    and run 'ticks' frames without waiting between them. Return their timing statistics.
+
+    If 'map_name' is given (e.g. "base_mod:city1/map"), the game is asked to load its first
+    map, and the map registered under 'map_name' is then loaded before measuring.
+    The first 'warmup' frames are run but not measured.
+
+    If 'profile' is set, the statistics of each phase of the frames are logged, and if
+    'trace' is given, the recorded phases are written to it in the Chrome trace format.
+    """
+    mods_info = mod_data.check_mods()
+    if mods is not None:
+        unknown = set(mods).difference(mods_info)
+        if unknown:
+            raise ValueError(f"Unknown mods: {', '.join(sorted(unknown))}.")
+        mods_info = [modname for modname in mods_info if modname in mods]
+    modlist = mod_data.import_mods(mods_info)
+
+    game_ = game.Game(modlist, headless=True, autostart=False, profile=profile or trace is not None)
+
+    if map_name is not None:
+        game_.status("load_first_map")
+        game_.run_ticks(1)
+        game_.wait_for_maps()
+        if map_name not in map.map_registry:
+            raise KeyError(f"No map registered under the name '{map_name}'.")
+        game_.load_map(map.map_registry[map_name])
+
+    game_.run_ticks(warmup)
+    game_.profiler.reset()
+    stats = game_.run_ticks(ticks)
+
+    if game_.profiler.enabled:
+        for name, phase_stats in game_.profiler.summary().items():
+            logger.RenderThreadInfo.log(f"Phase '{name}': p50 {phase_stats.p50 * 1000:.3f}ms, "
+                                        f"p95 {phase_stats.p95 * 1000:.3f}ms, p99 {phase_stats.p99 * 1000:.3f}ms")
+    if trace is not None:
+        game_.profiler.dump_chrome_trace(trace)
+        logger.RenderThreadInfo.log(f"Wrote frame trace to '{trace}'.")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the game headless for a fixed amount of frames and report frame timings.")
+    parser.add_argument("--ticks", type=int, default=600, help="amount of measured frames")
+    parser.add_argument("--warmup", type=int, default=10, help="amount of frames run before measuring")
+    parser.add_argument("--mod", action="append", dest="mods", help="mod to load (can be repeated, defaults to all mods)")
+    parser.add_argument("--map", dest="map_name", help="registry name of the map to measure, e.g. 'base_mod:city1/map'")
+    parser.add_argument("--profile", action="store_true", help="report the timings of each phase of the frames")
+    parser.add_argument("--trace", help="write a Chrome trace of the frames' phases to this file")
+    arguments = parser.parse_args()
+
+    stats = run_headless(arguments.ticks, arguments.mods, arguments.map_name, arguments.warmup,
+                         arguments.profile, arguments.trace)
+    logger.RenderThreadInfo.log(f"Benchmark results: {stats}.")
@@ -6,6 +6,48 @@ module = type(localization)
 
 MAX_FPS = 60
 
+# amount of simulation steps per second, whatever the frame rate is:
+SIM_TICK_RATE = 60
+
+# maximum amount of simulation steps run in a single frame to catch up with the time:
+MAX_SIM_STEPS = 5
+
+# maximum amount of consecutive frames that are not drawn while the simulation is late:
+MAX_FRAME_SKIP = 5
+
+# whether the simulation runs on its own thread, while the main thread only draws:
+THREADED_SIMULATION = False
+
+# amount of worker processes evaluating the NPCs' AI (one per CPU if None):
+AI_WORKERS = None
+
+# amount of NPCs whose AI is sent to a worker process at once:
+AI_BATCH_SIZE = 64
+
+# size in pixels of a cell of the maps' collision grid:
+COLLISION_CELL_SIZE = 64
+
+# maximum amount of memory in bytes used by cached images:
+ASSET_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# whether maps are compiled into a binary cache file next to their TMX file:
+MAP_CACHE = True
+
+# size in pixels of the feet the maps' navigation grids leave room for, with a margin:
+NAV_AGENT_SIZE = (24, 20)
+
+# amount of distance fields to the NPCs' destinations kept by the maps' navigation grids:
+NAV_FIELD_CACHE = 32
+
+# minimum time in seconds between two clicks of the same button:
+BUTTON_DEBOUNCE = 0.2
+
+# time in seconds between two autosaves:
+AUTOSAVE_INTERVAL = 60
+
+# maximum time in seconds between the game's launch and its first frame:
+STARTUP_BUDGET = 2.0
+
 # language-related constants:
 en_us = localization.Localization()
 en_us.DEFAULT_TITLE = "KarateKing - Main Menu"
@@ -0,0 +1,294 @@
+import pygame
+from tools import Coordinates, Direction, RGBColor
+from entity import MovingFrames, DIRECTIONS, DIRECTION_INDEX
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+_DIRECTION_VECTORS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+class CrowdSprite(pygame.sprite.Sprite):
+    def __init__(self, crowd: "Crowd"):
+        """
+        A thin sprite drawing one visible member of a crowd.
+        **internal class only!**
+        """
+        super().__init__()
+        self.crowd = crowd
+        self.index = -1
+        self.image = None
+        self.rect = pygame.rect.Rect(0, 0, crowd.frame_size[0], crowd.frame_size[1])
+
+    @property
+    def key(self) -> tuple["Crowd", int]:
+        """
+        The member this sprite currently draws. Used to follow members from one
+        map.FrameState to the next, since sprites are handed to other members.
+        """
+        return self.crowd, self.index
+
+
+class Crowd:
+    def __init__(self, frames: MovingFrames, capacity: int = 256, speed: int = 3, steps_delay: int = 100,
+                 image_bg_color: RGBColor = (0, 0, 0)):
+        """
+        A large population of NPCs that all use the same animated texture 'frames', stored in
+        numpy arrays instead of one LivingEntity each. Requires numpy.
+
+        Positions, speeds, rotations, animation counters and moving script cursors of all
+        the members are advanced together by self.step(). Moving scripts are lists of
+        (direction, repeat) steps, like LivingEntity.moving_script, but they are not run
+        the same way: at each step of its script, a member moves 'repeat' times in the
+        step's direction, then waits 'steps_delay' ticks before the next step, and the
+        script loops. A LivingEntity instead runs the current step of its script at every
+        tick and then puts its cursor back on the first step (see ai.think()), so that it
+        never waits and never goes past that step. Crowd members do not collide with the
+        map or with each other.
+
+        Only the members inside the camera's view get a sprite, see self.sync().
+        """
+        if numpy is None:
+            raise ImportError("Crowds require numpy, install it with 'pip install numpy'.")
+
+        self.frames = frames
+        self.frame_size = frames.sprite_sheet.frame_rect.size
+        self.frame_table = frames.compile(image_bg_color)
+        self.frame_count = frames.frame_limit["left"]
+        self.default_speed = speed
+        self.steps_delay = steps_delay
+        self.moving_animation_switch_rate = speed * 3
+
+        self.count = 0
+        self._free: list[int] = []
+        self.alive = numpy.zeros(capacity, dtype=bool)
+        self.position = numpy.zeros((capacity, 2), dtype=numpy.int32)
+        self.speed = numpy.zeros(capacity, dtype=numpy.int32)
+        self.rotation = numpy.full(capacity, DIRECTION_INDEX["down"], dtype=numpy.int8)
+        self.frameno = numpy.zeros(capacity, dtype=numpy.int16)
+        self.moving_counter = numpy.zeros(capacity, dtype=numpy.int32)
+        self.script_offset = numpy.zeros(capacity, dtype=numpy.int32)
+        self.script_length = numpy.zeros(capacity, dtype=numpy.int32)
+        self.step_index = numpy.zeros(capacity, dtype=numpy.int32)
+        self.tick = numpy.zeros(capacity, dtype=numpy.int32)
+
+        # the scripts of all the members, each stored once in the script table, with their offset,
+        # length and amount of members following them:
+        self._scripts: dict[tuple[tuple[Direction, int], ...], list[int]] = {}
+        self._script_at: dict[int, tuple[tuple[Direction, int], ...]] = {}
+        self._script_size = 0
+        self._dead_script_entries = 0
+        self._script_directions = numpy.zeros(16, dtype=numpy.int8)
+        self._script_repeats = numpy.zeros(16, dtype=numpy.int32)
+        self._vectors = numpy.array(_DIRECTION_VECTORS, dtype=numpy.int32)
+
+        self._sprites: list[CrowdSprite] = []
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def _grow(self):
+        """
+        Internal method that doubles the capacity of the crowd's arrays.
+        """
+        capacity = len(self.alive) * 2 or 1
+        for name in ("alive", "position", "speed", "rotation", "frameno", "moving_counter",
+                     "script_offset", "script_length", "step_index", "tick"):
+            array = getattr(self, name)
+            grown = numpy.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def _grow_scripts(self, needed: int):
+        """
+        Internal method that doubles the capacity of the script table until 'needed' entries fit in it.
+        """
+        capacity = len(self._script_directions) or 1
+        while capacity < needed:
+            capacity *= 2
+        for name in ("_script_directions", "_script_repeats"):
+            array = getattr(self, name)
+            grown = numpy.zeros(capacity, dtype=array.dtype)
+            grown[:self._script_size] = array[:self._script_size]
+            setattr(self, name, grown)
+
+    def _compile_script(self, script: list[tuple[Direction, int]]) -> tuple[int, int]:
+        """
+        Internal method that returns the offset and length of 'script' in the crowd's script
+        table, appending it to the table unless another member already follows the same script.
+        """
+        key = tuple((move, repeat) for move, repeat in script)
+        entry = self._scripts.get(key)
+        if entry is None:
+            directions = []
+            for move, repeat in key:
+                direction = move.lstrip("-")
+                if direction not in DIRECTION_INDEX:
+                    raise ValueError(f"Crowd members can only move, got action '{move}'.")
+                directions.append(DIRECTION_INDEX[direction])
+
+            offset, length = self._script_size, len(key)
+            if offset + length > len(self._script_directions):
+                self._grow_scripts(offset + length)
+            self._script_directions[offset:offset + length] = directions
+            self._script_repeats[offset:offset + length] = [repeat for move, repeat in key]
+            self._script_size += length
+            entry = self._scripts[key] = [offset, length, 0]
+            self._script_at[offset] = key
+        entry[2] += 1
+        return entry[0], entry[1]
+
+    def _release_script(self, offset: int):
+        """
+        Internal method called when a member following the script at 'offset' is removed.
+        Scripts no member follows anymore are dropped from the script table once they
+        take up half of it.
+        """
+        key = self._script_at[offset]
+        entry = self._scripts[key]
+        entry[2] -= 1
+        if entry[2]:
+            return
+        del self._scripts[key], self._script_at[offset]
+        self._dead_script_entries += entry[1]
+        if self._dead_script_entries * 2 >= self._script_size:
+            self._compact_scripts()
+
+    def _compact_scripts(self):
+        """
+        Internal method that moves the scripts still followed to the start of the script table,
+        and updates the script offsets of the members accordingly.
+        """
+        n = self.count
+        offsets = self.script_offset[:n]
+        following = self.alive[:n] & (self.script_length[:n] > 0)
+        new_offsets = offsets.copy()
+        directions = numpy.zeros_like(self._script_directions)
+        repeats = numpy.zeros_like(self._script_repeats)
+        size = 0
+        self._script_at = {}
+        for key, entry in self._scripts.items():
+            offset, length, users = entry
+            directions[size:size + length] = self._script_directions[offset:offset + length]
+            repeats[size:size + length] = self._script_repeats[offset:offset + length]
+            new_offsets[following & (offsets == offset)] = size
+            entry[0] = size
+            self._script_at[size] = key
+            size += length
+        self.script_offset[:n] = new_offsets
+        self._script_directions, self._script_repeats = directions, repeats
+        self._script_size = size
+        self._dead_script_entries = 0
+
+    def add(self, xy: Coordinates, moving_script: list[tuple[Direction, int]] = (), speed: int = None) -> int:
+        """
+        Add a member at 'xy' that follows 'moving_script', and return its index in the crowd.
+        """
+        if self._free:
+            index = self._free.pop()
+        else:
+            if self.count == len(self.alive):
+                self._grow()
+            index = self.count
+            self.count += 1
+
+        offset, length = self._compile_script(moving_script) if moving_script else (0, 0)
+        self.alive[index] = True
+        self.position[index] = xy
+        self.speed[index] = self.default_speed if speed is None else speed
+        self.rotation[index] = DIRECTION_INDEX["down"]
+        self.frameno[index] = 0
+        self.moving_counter[index] = 0
+        self.script_offset[index] = offset
+        self.script_length[index] = length
+        self.step_index[index] = 0
+        self.tick[index] = 0
+        return index
+
+    def remove(self, index: int):
+        """
+        Remove the member 'index' from the crowd. Its index may be reused by a later member.
+        """
+        if not self.alive[index]:
+            raise KeyError(f"Crowd has no member {index}.")
+        self.alive[index] = False
+        if self.script_length[index]:
+            self.script_length[index] = 0
+            self._release_script(int(self.script_offset[index]))
+        self._free.append(index)
+
+    def step(self):
+        """
+        Advance all the members of the crowd by one tick: the members whose wait is over
+        take the current step of their script, then the cursors of the members that waited
+        self.steps_delay ticks since their last step move on to the next one.
+        """
+        n = self.count
+        length = self.script_length[:n]
+        tick = self.tick[:n]
+        active = self.alive[:n] & (length > 0)
+
+        moving = numpy.flatnonzero(active & (tick == 0))
+        if len(moving):
+            script_index = self.script_offset[moving] + self.step_index[moving]
+            directions = self._script_directions[script_index]
+            repeats = self._script_repeats[script_index]
+            self.position[moving] += self._vectors[directions] * (self.speed[moving] * repeats)[:, None]
+            self.rotation[moving] = directions
+            self.moving_counter[moving] += repeats
+
+            counter = self.moving_counter[:n]
+            switch = counter > self.moving_animation_switch_rate
+            self.frameno[:n][switch] = (self.frameno[:n][switch] + 1) % self.frame_count
+            counter[switch] = 0
+
+        tick[active] += 1
+        wrap = numpy.flatnonzero(active & (tick > self.steps_delay))
+        if len(wrap):
+            tick[wrap] = 0
+            self.step_index[wrap] = (self.step_index[wrap] + 1) % length[wrap]
+
+    def visible(self, view: pygame.Rect) -> "numpy.ndarray":
+        """
+        Return the indices of the members that are at least partly inside 'view'.
+        """
+        n = self.count
+        x = self.position[:n, 0]
+        y = self.position[:n, 1]
+        width, height = self.frame_size
+        mask = (self.alive[:n] & (x + width > view.left) & (x < view.right) &
+                (y + height > view.top) & (y < view.bottom))
+        return numpy.flatnonzero(mask)
+
+    def sync(self, group: pygame.sprite.AbstractGroup, view: pygame.Rect):
+        """
+        Give a sprite, in 'group', to every member visible in 'view', and take back
+        the sprites of the members that are not visible anymore.
+        """
+        indices = self.visible(view)
+        while len(self._sprites) < len(indices):
+            self._sprites.append(CrowdSprite(self))
+
+        table = self.frame_table
+        positions = self.position[indices].tolist()
+        rotations = self.rotation[indices].tolist()
+        framenos = self.frameno[indices].tolist()
+        for sprite, index, (x, y), rotation, frameno in zip(self._sprites, indices.tolist(), positions, rotations, framenos):
+            sprite.index = index
+            sprite.rect.topleft = x, y
+            sprite.image = table[rotation][frameno]
+            if not sprite.alive():
+                group.add(sprite)
+
+        for sprite in self._sprites[len(indices):]:
+            if sprite.alive():
+                sprite.kill()
+
+    def direction_of(self, index: int) -> str:
+        """
+        Return the direction the member 'index' is facing.
+        """
+        return DIRECTIONS[self.rotation[index]]
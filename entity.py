@@ -1,41 +1,104 @@
 import pygame
+import os
+import weakref
 from os import PathLike
 from tools import Registry, Coordinates, RGBColor, Action, Direction
 import logger
+import ai
+from assets import asset_manager
 from typing import Literal
 
 
 class SpriteSheet:
-    def __init__(self, image: str or PathLike, x_frames: int, y_frames: int, frame_size: tuple[int, int]):
+    # only kept while something uses them, so that they don't escape the asset manager's budget:
+    _shared: "weakref.WeakValueDictionary[tuple, SpriteSheet]" = weakref.WeakValueDictionary()
+
+    def __init__(self, image: str or PathLike, x_frames: int, y_frames: int, frame_size: tuple[int, int],
+                 mode: Literal["subsurface", "copy"] = "subsurface"):
         """
         Sort the 'image' sprite sheet as a grid of (x_frames * y_frames) dimensions, considering
         that a frame's size is 'frame_size'.
 
         Will iterate through frames on the image from left to right, and from top to bottom.
+
+        Frames are only built the first time they are accessed. In "subsurface" mode, they
+        are views into the sprite sheet's pixels and share its memory, while in "copy" mode
+        each frame is copied into its own surface.
         """
-        self.frames = []
+        if mode not in ("subsurface", "copy"):
+            raise ValueError(f"Unknown sprite sheet mode '{mode}'.")
+        self.mode = mode
+        self.x_frames = x_frames
+        self.y_frames = y_frames
         self.frame_rect = pygame.rect.Rect(0, 0, *frame_size)
-        lign = 0
-        column = 0
-        sheet = pygame.image.load(image)
+        self.sheet = asset_manager.load(image)
+        self.frames = _LazyFrames(self, x_frames * y_frames)
+
+    @classmethod
+    def shared(cls, image: str or PathLike, x_frames: int, y_frames: int, frame_size: tuple[int, int],
+               mode: Literal["subsurface", "copy"] = "subsurface") -> "SpriteSheet":
+        """
+        Return a sprite sheet shared by all the callers using the same arguments,
+        creating it on the first call. Entities spawned from the same image then
+        share their frames instead of building their own. The sheet is forgotten
+        once nothing uses it anymore.
+        """
+        key = (os.path.abspath(image), x_frames, y_frames, tuple(frame_size), mode)
+        sheet = cls._shared.get(key)
+        if sheet is None:
+            sheet = cls(image, x_frames, y_frames, frame_size, mode)
+            cls._shared[key] = sheet
+        return sheet
+
+    def frame_area(self, num: int) -> pygame.rect.Rect:
+        """
+        Return the area of the 'num' -th frame on the sprite sheet.
+        """
+        lign, column = divmod(num, self.x_frames)
+        return self.frame_rect.move(column * self.frame_rect.w, lign * self.frame_rect.h)
 
-        for i in range(y_frames):
-            current_y = lign * frame_size[1]
-            for j in range(x_frames):
-                result = pygame.Surface(frame_size)
-                current_x = column * frame_size[0]
+    def _make_frame(self, num: int) -> pygame.Surface:
+        """
+        Internal method that builds the 'num' -th frame of the sprite sheet.
+        """
+        area = self.frame_area(num)
+        if self.mode == "subsurface":
+            return self.sheet.subsurface(area)
+        result = pygame.Surface(area.size)
+        result.blit(self.sheet, (0, 0), area)
+        return result
 
-                min_x = current_x
-                max_x = min_x + frame_size[0]
 
-                min_y = current_y
-                max_y = min_y + frame_size[1]
+class _LazyFrames:
+    def __init__(self, sheet: SpriteSheet, count: int):
+        """
+        The frames of a sprite sheet, built on first access.
+        **internal class only!**
+        """
+        self._sheet = sheet
+        self._frames: list[pygame.Surface or None] = [None] * count
 
-                result.blit(sheet, (0, 0), pygame.rect.Rect(min_x, min_y, max_x - min_x, max_y - min_y))
-                self.frames.append(result)
-                column += 1
-            lign += 1
-            column = 0
+    def __getitem__(self, item: int or slice) -> pygame.Surface or list[pygame.Surface]:
+        if isinstance(item, slice):
+            return [self[i] for i in range(len(self._frames))[item]]
+        frame = self._frames[item]
+        if frame is None:
+            num = range(len(self._frames))[item]
+            frame = self._sheet._make_frame(num)
+            self._frames[num] = frame
+        return frame
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __iter__(self):
+        for i in range(len(self._frames)):
+            yield self[i]
+
+
+DIRECTIONS: tuple[str, str, str, str] = ("left", "right", "up", "down")
+"""The 4 directions an entity can face, in the order used by frame tables."""
+DIRECTION_INDEX: dict[str, int] = {direction: i for i, direction in enumerate(DIRECTIONS)}
 
 
 class MovingFrames:
@@ -45,41 +108,52 @@ class MovingFrames:
         4 cardinal points (left, right, up and down) and by animation order.
         """
         self.dict = {}
-        self.frame_limit = {
-            "left": len(left_frames),
-            "right": len(right_frames),
-            "up": len(up_frames),
-            "down": len(down_frames)
+        self.sequences = {
+            "left": tuple(left_frames),
+            "right": tuple(right_frames),
+            "up": tuple(up_frames),
+            "down": tuple(down_frames)
         }
+        self.frame_limit = {direction: len(frames) for direction, frames in self.sequences.items()}
         self.sprite_sheet = sprite_sheet
-        left_frame_counter = 1
-        for frame in left_frames:
-            try:
-                self.dict[f"left{left_frame_counter}"] = sprite_sheet.frames[frame]
-            except KeyError:
-                raise KeyError(f"Sprite sheet has no frame {frame}.")
-            left_frame_counter += 1
-        right_frame_counter = 1
-        for frame in right_frames:
-            try:
-                self.dict[f"right{right_frame_counter}"] = sprite_sheet.frames[frame]
-            except KeyError:
-                raise KeyError(f"Sprite sheet has no frame {frame}.")
-            right_frame_counter += 1
-        up_frame_counter = 1
-        for frame in up_frames:
-            try:
-                self.dict[f"up{up_frame_counter}"] = sprite_sheet.frames[frame]
-            except KeyError:
-                raise KeyError(f"Sprite sheet has no frame {frame}.")
-            up_frame_counter += 1
-        down_frame_counter = 1
-        for frame in down_frames:
-            try:
-                self.dict[f"down{down_frame_counter}"] = sprite_sheet.frames[frame]
-            except KeyError:
-                raise KeyError(f"Sprite sheet has no frame {frame}.")
-            down_frame_counter += 1
+        self._tables: dict[tuple, tuple[tuple[pygame.Surface, ...], ...]] = {}
+        for direction in DIRECTIONS:
+            frame_counter = 1
+            for frame in self.sequences[direction]:
+                try:
+                    self.dict[f"{direction}{frame_counter}"] = sprite_sheet.frames[frame]
+                except IndexError:
+                    raise KeyError(f"Sprite sheet has no frame {frame}.")
+                frame_counter += 1
+
+    def compile(self, colorkey: RGBColor = (0, 0, 0)) -> tuple[tuple[pygame.Surface, ...], ...]:
+        """
+        Return the frame table of self: a tuple indexed by direction (in the DIRECTIONS order),
+        each item being the tuple of that direction's frames in animation order.
+
+        'colorkey' and RLE acceleration are applied to the frames once, when the table is
+        built. Tables are cached per colorkey, and frames that already use another
+        colorkey are copied instead of being modified.
+        """
+        colorkey = tuple(colorkey)
+        table = self._tables.get(colorkey)
+        if table is not None:
+            return table
+
+        table = []
+        for direction in DIRECTIONS:
+            frames = []
+            for i in range(self.frame_limit[direction]):
+                frame = self.dict[f"{direction}{i + 1}"]
+                current = frame.get_colorkey()
+                if current is not None and tuple(current[:3]) != colorkey:
+                    frame = frame.copy()
+                frame.set_colorkey(colorkey, pygame.RLEACCEL)
+                frames.append(frame)
+            table.append(tuple(frames))
+        table = tuple(table)
+        self._tables[colorkey] = table
+        return table
 
 
 Texture = str or PathLike or SpriteSheet
@@ -108,7 +182,7 @@ class Entity(pygame.sprite.Sprite):
             image_size = texture.frame_rect.w, texture.frame_rect.h
 
         else:
-            self.image = pygame.image.load(texture)
+            self.image = asset_manager.load(texture)
             image_size = self.image.get_rect().w, self.image.get_rect().h
 
         self.rect = pygame.rect.Rect(*xy, *image_size)
@@ -126,7 +200,6 @@ class Entity(pygame.sprite.Sprite):
         What happens to the entity at every round of the game's main loop.
         """
         self.rect.topleft = (self.rect.x, self.rect.y)
-        pygame.display.flip()
 
     def register(self, name: str, module):
         """
@@ -153,7 +226,7 @@ class MovingEntity(Entity):
         super().__init__(xy, texture)
 
         self.old_position = self.rect.x, self.rect.y
-        self.feet = feet_rect
+        self.feet = pygame.rect.Rect(feet_rect)
 
     def __cancel_move__(self):
         self.rect.x, self.rect.y = self.old_position
@@ -227,7 +300,6 @@ class MovingEntity(Entity):
         """
         self.rect.topleft = (self.rect.x, self.rect.y)
         self.feet.midbottom = self.rect.midbottom
-        pygame.display.flip()
         super().update(screen, *args, **kwargs)
 
 
@@ -250,6 +322,8 @@ class AnimatedMovingEntity(MovingEntity):
 
         super().__init__(xy, feet_rect, sorted_frames.sprite_sheet, speed=speed)
         self.last_frame = sorted_frames.frame_limit["left"]
+        self._rotation_index = DIRECTION_INDEX[self._rotation]
+        self._frame_table = sorted_frames.compile(self.bgcolor)
 
     @property
     def rotation(self):
@@ -257,6 +331,7 @@ class AnimatedMovingEntity(MovingEntity):
 
     @rotation.setter
     def rotation(self, value: Direction):
+        self._rotation_index = DIRECTION_INDEX[value]
         self._rotation = value
 
     def _choose_image(self):
@@ -264,8 +339,7 @@ class AnimatedMovingEntity(MovingEntity):
         Update self.image. Set it to the correct animation frame, depending on
         self.frameno and self.rotation .
         """
-        self.image = self.frames[self.rotation + str(self.frameno)]
-        self.image.set_colorkey(self.bgcolor)
+        self.image = self._frame_table[self._rotation_index][self.frameno - 1]
 
     def update(self, screen: pygame.Surface, *args, **kwargs):
         """
@@ -295,7 +369,7 @@ class AnimatedMovingEntity(MovingEntity):
 
 class LivingEntity(AnimatedMovingEntity):
     def __init__(self, xy: Coordinates, sprite_sheet: str or PathLike, feet_rect=pygame.rect.Rect(0, 0, 16, 12)):
-        sheet = SpriteSheet(sprite_sheet, 3, 4, (32, 32))
+        sheet = SpriteSheet.shared(sprite_sheet, 3, 4, (32, 32))
 
         self._say = None
 
@@ -311,6 +385,11 @@ class LivingEntity(AnimatedMovingEntity):
         self.current_step = 0
         self.current_tick = 0
         self.moving_steps_delay = 100
+        self.goal: Coordinates or None = None
+        # the direction to take to reach self.goal, given by the map's navigation grid:
+        self.route: Direction or None = None
+        # when set, self's AI is evaluated by the map's ai.AIStage instead of by self.update():
+        self.ai_driven = False
 
     @property
     def moving_script(self):
@@ -335,22 +414,19 @@ class LivingEntity(AnimatedMovingEntity):
     def say(self, text: str):
         self._say = text
 
-    def update(self, screen: pygame.Surface, *args, **kwargs):
-        if len(self._moving_algorithm) > 0:
-            if len(self._moving_algorithm) > self.current_step:
-                move, repeat = self._moving_algorithm[self.current_step]
-                for i in range(repeat):
-                    self.choose_move(move)
-
-                self.current_step = 0
-                self.current_tick = 0
+    def apply_intent(self, intent: "ai.Intent"):
+        """
+        Take the actions decided by self's AI, and move its moving script's cursor.
+        """
+        for move in intent.actions:
+            self.choose_move(move)
+        self.feet.midbottom = self.rect.midbottom
+        self.current_step = intent.step
+        self.current_tick = intent.tick
 
-            else:
-                if self.current_tick >= self.moving_steps_delay:
-                    self.current_tick = 0
-                    self.current_step += 1
-                else:
-                    self.current_tick += 1
+    def update(self, screen: pygame.Surface, *args, **kwargs):
+        if not self.ai_driven:
+            self.apply_intent(ai.think(ai.NPCState.of(self)))
         super().update(screen, *args, **kwargs)
 
     def rotate_left(self):
@@ -0,0 +1,89 @@
+import sys
+import pygame
+from pyerror_display import PyError
+
+
+_KEY_EVENTS = frozenset((pygame.KEYDOWN, pygame.KEYUP))
+
+
+class EventBus:
+    def __init__(self):
+        """
+        Dispatches pygame events to the handlers subscribed to their type.
+
+        Handlers subscribe to an event type (e.g. pygame.KEYDOWN), and optionally to a
+        specific key for keyboard events. They are called as handler(event, game).
+        Dispatching an event only costs a dict lookup when nobody subscribed to its type.
+        """
+        self._handlers: dict[tuple[int, int or None], list[callable]] = {}
+        self._table: dict[tuple[int, int or None], tuple[callable, ...]] = {}
+        self._types: frozenset[int] = frozenset()
+
+    def _compile(self):
+        """
+        Internal method that rebuilds the dispatch table of the bus.
+        Called every time a handler subscribes or unsubscribes.
+        """
+        self._table = {key: tuple(handlers) for key, handlers in self._handlers.items() if handlers}
+        self._types = frozenset(event_type for event_type, key in self._table)
+
+    def subscribe(self, event_type: int, handler: callable, key: int = None) -> callable:
+        """
+        Call 'handler' every time an event of type 'event_type' is dispatched.
+        If 'key' is given, 'event_type' must be pygame.KEYDOWN or pygame.KEYUP, and
+        'handler' is only called for events of that key.
+        """
+        if key is not None and event_type not in _KEY_EVENTS:
+            raise ValueError("Only keyboard events can be subscribed to with a key.")
+        self._handlers.setdefault((event_type, key), []).append(handler)
+        self._compile()
+        return handler
+
+    def unsubscribe(self, event_type: int, handler: callable, key: int = None):
+        """
+        Stop calling 'handler' for events of type 'event_type' (and key 'key').
+        """
+        try:
+            self._handlers[(event_type, key)].remove(handler)
+        except (KeyError, ValueError):
+            raise ValueError(f"{handler} is not subscribed to this event.") from None
+        self._compile()
+
+    def on(self, event_type: int, key: int = None):
+        """
+        Same as self.subscribe(), but meant to be used as a function decorator:
+
+            @events.event_bus.on(pygame.KEYDOWN, key=pygame.K_ESCAPE)
+            def on_escape(event, game_):
+                ...
+        """
+        def decorator(handler: callable) -> callable:
+            return self.subscribe(event_type, handler, key)
+        return decorator
+
+    def wants(self, event_type: int) -> bool:
+        """
+        Whether at least one handler subscribed to events of type 'event_type'.
+        """
+        return event_type in self._types
+
+    def dispatch(self, event: pygame.event.Event, game):
+        """
+        Call the handlers subscribed to 'event'.
+        """
+        event_type = event.type
+        if event_type not in self._types:
+            return
+        table = self._table
+        handlers = table.get((event_type, None), ())
+        if event_type in _KEY_EVENTS:
+            handlers += table.get((event_type, event.key), ())
+        for handler in handlers:
+            try:
+                handler(event, game)
+            except:
+                PyError(*sys.exc_info(), handler.__code__.co_filename)
+
+
+event_bus = EventBus()
+"""The game's event bus, that mods can subscribe to."""
@@ -1,5 +1,5 @@
 from const import module, en_us
-from tools import Registry
+from tools import Registry, FrameStats
 import window
 from typing import Literal, Any, Final
 import logger
@@ -12,6 +12,14 @@ import pygame.constants
 import map
 import entity
 import thread
+import profiler
+import events
+import saving
+import startup
+import simulation
+import ai
+from pyerror_display import PyError
+import os
 from os import PathLike
 import logging
 import const
@@ -36,7 +44,7 @@ def check_key_type(to_check: pygame.event.Event, key: int):
     return to_check.type == key
 
 
-@Trigger
+@Trigger.noop
 def OnGameStarts(modlist: dict, win: window.Window, game_) -> tuple[Literal[0, 1], Any] or Literal[0, 1]:
     """
     A trigger that you can override freely and safely to do custom actions on game starts.
@@ -47,15 +55,17 @@ def OnGameStarts(modlist: dict, win: window.Window, game_) -> tuple[Literal[0, 1
     return 0
 
 
-@Trigger
+@Trigger.noop
 def OnKeyPressed(key, game, window_):
     """
     Same as OnGameStarts, but activates only when a pygame event is triggered.
+    It is called for every event, so prefer subscribing to the events you need
+    with events.event_bus .
     """
     return 0
 
 
-@Trigger
+@Trigger.noop
 def OnExit(game, window_):
     """
     Same as OnGameStarts, but activates only when game attempts to exit.
@@ -63,7 +73,7 @@ def OnExit(game, window_):
     return 0
 
 
-@Trigger
+@Trigger.noop
 def OnMapUnload(map_: map.MapTMX, win: window.Window, game_):
     """
     Same as OnGameStarts, but activates only when a map is unloaded.
@@ -71,7 +81,7 @@ def OnMapUnload(map_: map.MapTMX, win: window.Window, game_):
     return 0
 
 
-@Trigger
+@Trigger.noop
 def OnGUIUnload(gui_: gui.GUI, win: window.Window, game_):
     """
     Same as OnGameStarts, but activates only when a GUI is unloaded.
@@ -79,7 +89,7 @@ def OnGUIUnload(gui_: gui.GUI, win: window.Window, game_):
     return 0
 
 
-@Trigger
+@Trigger.noop
 def OnReadyToLoadMap(window_, game_):
     """
     Same as OnGameStarts, but activates only when the game is ready to load it's first map.
@@ -88,7 +98,26 @@ def OnReadyToLoadMap(window_, game_):
 
 
 class Game:
-    def __init__(self, mods: dict[str, module]):
+    def __init__(self, mods: dict[str, module], headless=False, autostart=True, profile=False,
+                 threaded=const.THREADED_SIMULATION):
+        """
+        Start the game with the active mods 'mods'.
+        If 'headless' is set, no real window is opened (SDL's dummy video driver is used).
+        If 'autostart' is not set, the main loop is not entered, so that the caller
+        can drive the game itself, e.g. with self.run_ticks().
+        If 'profile' is set, the duration of each phase of the frames is recorded in self.profiler.
+        If 'threaded' is set, the main loop runs the simulation on its own thread (see
+        simulation.SimulationThread) and only draws on the main thread.
+        """
+        self.headless = headless
+        self.threaded = threaded
+        self.simulation: simulation.SimulationThread or None = None
+        self.profiler = profiler.FrameProfiler()
+        if profile:
+            self.profiler.enable()
+        if headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
 
         self.disable_pyscroll_log()
         self._map_t = None
@@ -96,19 +125,36 @@ class Game:
         self.running = False
         self._status = "menu"
         self.clock = pygame.time.Clock()
+        self.sim_dt = 1 / const.SIM_TICK_RATE
+        self.sim_steps = 0
+        self.skipped_frames = 0
+        self._accumulator = 0.0
+        self._last_tick: float or None = None
+        self._frame_skip = 0
         modlist: Final = mods
-        pygame.init()
+        startup.profile.budget = const.STARTUP_BUDGET
+        with startup.profile.phase("pygame.init"):
+            pygame.init()
         # open window:
         self.win = window.Window(en_us.DEFAULT_TITLE)
+        startup.profile.mark("window")
         logger.RenderThreadInfo.log("Finishing up...")
 
         self._active_map = None
+        self._map_loads: list[map.MapLoader] = []
+        self.autosave: saving.Autosave or None = None
         self.screen = self.win.screen
+        self.compositor = self.win.compositor
+        self.events = events.event_bus
+        self.ai = ai.AIStage()
         # run trigger:
-        OnGameStarts(modlist, self.win, self)
+        OnGameStarts.fire(modlist, self.win, self)
+        startup.profile.mark("main_menu")
         logger.RenderThreadInfo.log("Done!")
+        self._first_frame = True
         self.in_menu = False
-        self.mainloop()
+        if autostart:
+            self.mainloop()
 
     @staticmethod
     def disable_pyscroll_log():
@@ -116,8 +162,18 @@ class Game:
         pyscroll_logger.disabled = True
 
     def exit(self):
+        if self.simulation is not None:
+            if self.simulation.is_current():
+                # the main thread exits the game once the simulation stopped:
+                self.running = False
+                self.simulation.stop()
+                return
+            self.simulation.stop()
         logger.RenderThreadInfo.log("Exiting game...")
-        OnExit(self, self.win)
+        OnExit.fire(self, self.win)
+        if self.autosave is not None:
+            self.autosave.stop()
+        self.ai.shutdown()
         pygame.quit()
         sys.exit()
 
@@ -142,9 +198,10 @@ class Game:
         map_.active = True
         self._status = "map"
 
-    def update_registry(self, reg: Registry, on_unload: Trigger):
+    @staticmethod
+    def simulate_registry(reg: Registry, on_unload: Trigger):
         for k, v in reg:
-            v.update(self.screen)
+            v.simulate()
             v.on_unload = on_unload
 
     def handle_inputs(self):
@@ -152,32 +209,237 @@ class Game:
             if event.type == pygame.QUIT:
                 self.running = False
                 self.exit()
-            OnKeyPressed(event.type, self, self.win)
+            self.dispatch_event(event)
+
+    def dispatch_event(self, event: pygame.event.Event):
+        """
+        Hand 'event' to the event bus' handlers and to the OnKeyPressed trigger.
+        """
+        self.events.dispatch(event, self)
+        if OnKeyPressed.overridden:
+            OnKeyPressed.fire(event.type, self, self.win)
+
+    def simulate(self):
+        """
+        Run one fixed simulation step (self.sim_dt seconds) of the active maps or menus.
+        """
+        if self._status == "map":
+            with self.profiler.phase("update:maps"):
+                self.simulate_registry(map.map_registry, OnMapUnload)
+
+        if self._status == "menu":
+            with self.profiler.phase("update:menus"):
+                self.simulate_registry(gui.menu_registry, OnGUIUnload)
+        self.sim_steps += 1
+
+    def update_logic(self):
+        """
+        Everything the game does once per frame besides simulation steps: build the maps
+        loaded in the background, fire the triggers that are due, and autosave.
+        """
+        if self._map_loads:
+            self.finish_map_loads()
+
+        if self._status == "load_first_map":
+            with self.profiler.phase("triggers"):
+                OnReadyToLoadMap.fire(self.win, self)
+
+        if self.autosave is not None:
+            self.autosave.tick()
+
+    def capture(self, time_: float = None) -> simulation.RenderSnapshot:
+        """
+        Return what has to be drawn after the last simulation step, that stands for the
+        time 'time_' (now by default).
+        """
+        if time_ is None:
+            time_ = time.perf_counter()
+        maps = tuple((map_, map_.previous_state, map_.state) for name, map_ in map.map_registry if map_.active)
+        menus = tuple((menu, menu.capture()) for name, menu in gui.menu_registry if menu.active)
+        loading = min((loader.progress for loader in self._map_loads), default=None)
+        return simulation.RenderSnapshot(self._status, time_, maps, menus, loading)
+
+    def draw(self, snapshot: simulation.RenderSnapshot, alpha: float):
+        """
+        Draw 'snapshot', 'alpha' of a simulation step after its last step.
+        """
+        if snapshot.status == "map":
+            with self.profiler.phase("draw:maps"):
+                for map_, previous, current in snapshot.maps:
+                    map_.draw(self.screen, previous, current, alpha)
+
+        if snapshot.status == "menu":
+            with self.profiler.phase("draw:menus"):
+                for menu, state in snapshot.menus:
+                    menu.draw(self.screen, state, alpha)
+
+        if snapshot.status == "frozen":
+            self.draw_loading_screen(snapshot.loading)
+
+    def tick(self, dt: float = None):
+        """
+        Run one frame of the game: run as many fixed simulation steps as fit in the time
+        elapsed since the last frame ('dt' seconds if given), then draw the game between
+        the last two steps. When the simulation is late, up to const.MAX_FRAME_SKIP frames
+        in a row are not drawn, then the time it could not catch up with is dropped.
+        """
+        now = time.perf_counter()
+        if dt is None:
+            dt = self.sim_dt if self._last_tick is None else now - self._last_tick
+        self._last_tick = now
+
+        with self.profiler.phase("frame"):
+            with self.profiler.phase("inputs"):
+                self.handle_inputs()
+
+            self._accumulator += dt
+            steps = 0
+            while self._accumulator >= self.sim_dt and steps < const.MAX_SIM_STEPS:
+                self.simulate()
+                self._accumulator -= self.sim_dt
+                steps += 1
+
+            self.update_logic()
+
+            late = self._accumulator >= self.sim_dt
+            if late and self._frame_skip < const.MAX_FRAME_SKIP:
+                self._frame_skip += 1
+                self.skipped_frames += 1
+            else:
+                if late:
+                    self._accumulator %= self.sim_dt
+                self._frame_skip = 0
+                self.draw(self.capture(), self._accumulator / self.sim_dt)
+
+            # present everything that was drawn during this frame at once:
+            with self.profiler.phase("present"):
+                self.compositor.present()
+
+        self._after_frame()
+
+    def render_tick(self):
+        """
+        Run one frame of the main thread while the simulation runs on its own thread:
+        pump pygame's events and hand them to the simulation, then draw its last snapshot.
+        """
+        with self.profiler.phase("frame"):
+            with self.profiler.phase("inputs"):
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        self.running = False
+                        self.exit()
+                    self.simulation.post(event)
+
+            snapshot = self.simulation.snapshot
+            if snapshot is not None:
+                alpha = min((time.perf_counter() - snapshot.time) / self.sim_dt, 1.0)
+                self.draw(snapshot, alpha)
+
+            with self.profiler.phase("present"):
+                self.compositor.present()
+
+        self._after_frame()
+
+    def _after_frame(self):
+        if self._first_frame:
+            self._first_frame = False
+            startup.profile.mark("first_frame")
+            startup.profile.report()
 
     def mainloop(self):
         self.running = True
-
-        while self.running:
-
-            self.handle_inputs()
-
-            if self._status == "map":
-                self.update_registry(map.map_registry, OnMapUnload)
-
-            if self._status == "menu":
-                self.update_registry(gui.menu_registry, OnGUIUnload)
-
-            if self._status == "frozen":
-                self.screen.fill((0, 0, 0))
-
-            if self._status == "load_first_map":
-                OnReadyToLoadMap(self.win, self)
-
+        if not self.threaded:
+            while self.running:
+                self.tick()
+                self.clock.tick(const.MAX_FPS)
+            return
+
+        self.simulation = simulation.SimulationThread(self)
+        self.simulation.start()
+        while self.running and self.simulation.running:
+            self.render_tick()
             self.clock.tick(const.MAX_FPS)
+        # the simulation stopped, because of game.exit() or of a crash:
+        self.exit()
+
+    def run_ticks(self, ticks: int) -> FrameStats:
+        """
+        Run 'ticks' frames of the game as fast as possible, without waiting
+        between frames, and return their timing statistics.
+        Each frame runs exactly one simulation step, whatever its duration,
+        on the calling thread.
+        """
+        self.running = True
+        frame_times = []
+        for i in range(ticks):
+            if not self.running:
+                break
+            start = time.perf_counter()
+            self.tick(self.sim_dt)
+            frame_times.append(time.perf_counter() - start)
+            self.clock.tick()
+        return FrameStats(frame_times)
 
     def new_map(self, tmx: str or PathLike, center: tuple[int, int], zoom: int or float) -> map.MapTMX:
         return map.MapTMX(tmx, OnMapUnload, self, center, zoom)
 
+    def new_map_async(self, tmx: str or PathLike, center: tuple[int, int], zoom: int or float,
+                      on_loaded: callable) -> map.MapLoader:
+        """
+        Same as self.new_map(), but the map is parsed on a worker thread while the game keeps running.
+        When it is loaded, the map is built on the main thread and 'on_loaded(map_)' is called.
+        Set the game's status to "frozen" to show a loading screen in the meantime.
+        """
+        loader = map.MapLoader(tmx, center, zoom, on_loaded)
+        self._map_loads.append(loader)
+        loader.start()
+        return loader
+
+    @property
+    def loading(self) -> bool:
+        """
+        Whether maps are currently being loaded in the background.
+        """
+        return bool(self._map_loads)
+
+    def finish_map_loads(self):
+        """
+        Build the maps that were loaded in the background, and hand them to their callbacks.
+        """
+        for loader in [loader for loader in self._map_loads if loader.done]:
+            self._map_loads.remove(loader)
+            if loader.error is not None:
+                PyError(*loader.error, str(loader.tmx))
+                continue
+            map_ = map.MapTMX(loader.data, OnMapUnload, self, loader.center, loader.zoom)
+            loader.progress = 1.0
+            try:
+                loader.on_loaded(map_)
+            except:
+                PyError(*sys.exc_info(), loader.on_loaded.__code__.co_filename)
+
+    def wait_for_maps(self):
+        """
+        Block until every map being loaded in the background is done, and hand them to their callbacks.
+        """
+        for loader in list(self._map_loads):
+            loader.wait()
+        self.finish_map_loads()
+
+    def draw_loading_screen(self, progress: float = None):
+        """
+        Draw the screen shown while the game is frozen, with the progress of the maps
+        being loaded ('progress', from 0 to 1), if any.
+        """
+        self.screen.fill((0, 0, 0))
+        if progress is not None:
+            width, height = self.screen.get_size()
+            bar = pygame.Rect(0, 0, width // 2, 12)
+            bar.center = width // 2, height * 3 // 4
+            pygame.draw.rect(self.screen, (255, 255, 255), bar, 1)
+            pygame.draw.rect(self.screen, (255, 255, 255), (bar.x, bar.y, round(bar.w * progress), bar.h))
+        self.compositor.invalidate()
+
     def new_menu(self, bg: str or PathLike) -> gui.Menu:
         return gui.Menu(bg, self, OnMapUnload)
 
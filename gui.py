@@ -2,7 +2,22 @@ import pygame
 import os
 from tools import Registry
 import logger
+from assets import asset_manager
+from typing import Literal, NamedTuple, Any
 import time
+import const
+
+
+class MenuState(NamedTuple):
+    """
+    What a menu shows at the end of a simulation step: its background, and for each
+    of its widgets its key, image and rect. Plain values only, so that it can be drawn
+    while the simulation changes the widgets. 'activation' counts the times the menu
+    was activated, so that it is drawn in full after each of them.
+    """
+    background: pygame.Surface
+    widgets: tuple[tuple[Any, pygame.Surface, tuple[int, int, int, int]], ...]
+    activation: int
 
 
 class GUI:
@@ -22,6 +37,22 @@ class GUI:
 
     def update(self, *args, **kwargs): pass
 
+    def simulate(self):
+        """
+        Run one simulation step of self.
+        """
+
+    def capture(self) -> MenuState or None:
+        """
+        Return the current state of self, as it should be drawn.
+        """
+
+    def draw(self, screen: pygame.Surface, state: MenuState or None, alpha: float):
+        """
+        Draw the state 'state' of self on 'screen'. 'alpha' is the fraction of the
+        simulation step elapsed since the last call of self.simulate() (0 to 1).
+        """
+
     def _register_update(self):
         module, name = self.RegistryName
         menu_registry.register(f"{module}:{name}", self)
@@ -44,12 +75,21 @@ class GUI:
 
 menu_registry = Registry(GUI)
 
+_MOUSE_EVENTS = (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP)
+
 
 class Button(pygame.sprite.Sprite):
-    def __init__(self, pos: tuple[int, int], cut_ratio: tuple[float, float], image: str or os.PathLike, command: callable = None):
+    def __init__(self, pos: tuple[int, int], cut_ratio: tuple[float, float], image: str or os.PathLike, command: callable = None,
+                 debounce: float = const.BUTTON_DEBOUNCE):
+        """
+        A clickable widget. A button is driven by the mouse events its menu hands to self.handle_event():
+        its self.state is "idle", "hover" (the mouse is over it) or "pressed" (the left
+        mouse button went down over it). It is clicked when the button is released
+        over it, unless the last click was less than 'debounce' seconds ago.
+        """
         super().__init__()
 
-        self.image = pygame.image.load(image)
+        self.image = asset_manager.load(image)
         new_pos = pos
         new_size = round(self.image.get_rect().width / cut_ratio[0]), round(self.image.get_rect().height / cut_ratio[1])
         new_rect = pygame.rect.Rect(*new_pos, *new_size)
@@ -63,37 +103,144 @@ class Button(pygame.sprite.Sprite):
         if command is None:
             self.command = self.default_command
 
-    def default_command(self, *args, **kwargs): pass
-
-    def update(self, screen, *args, **kwargs) -> None:
-        left, middle, right = pygame.mouse.get_pressed(3)
-        if left and self._mouse_on_top():
-            self.command(*self.command_args, **self.command_kwargs)
+        self.state: Literal["idle", "hover", "pressed"] = "idle"
+        self.debounce = debounce
+        self._last_click = -debounce
 
-            time.sleep(0.5)
+    def default_command(self, *args, **kwargs): pass
 
-    def _mouse_on_top(self):
-        return bool(self.rect.collidepoint(*pygame.mouse.get_pos()))
+    def _set_state(self, state: Literal["idle", "hover", "pressed"]):
+        """
+        Internal method that changes self's state.
+        """
+        self.state = state
+
+    def handle_event(self, event: pygame.event.Event):
+        """
+        Update self's state according to the mouse event 'event', and click it if needed.
+        """
+        if event.type == pygame.MOUSEMOTION:
+            if self.state != "pressed":
+                self._set_state("hover" if self.rect.collidepoint(event.pos) else "idle")
+
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == pygame.BUTTON_LEFT:
+            if self.rect.collidepoint(event.pos):
+                self._set_state("pressed")
+
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == pygame.BUTTON_LEFT:
+            over = self.rect.collidepoint(event.pos)
+            pressed = self.state == "pressed"
+            self._set_state("hover" if over else "idle")
+            if pressed and over:
+                self.click()
+
+    def click(self):
+        """
+        Run self's command, unless self was clicked less than self.debounce seconds ago.
+        """
+        now = time.perf_counter()
+        if now - self._last_click < self.debounce:
+            return
+        self._last_click = now
+        self.command(*self.command_args, **self.command_kwargs)
 
 
 class Menu(GUI):
     def __init__(self, bg: str or os.PathLike, game, on_unload):
+        """
+        A full screen menu: a background and widgets.
+
+        Menus are drawn from the states self.capture() returns (see MenuState), so that
+        they can be drawn on another thread than the simulation. Only the widgets whose
+        image or rect changed since the last state drawn are redrawn, and only the areas
+        they cover are presented to the display, so that a static menu costs nothing to
+        draw. A widget that draws on its own image must thus give itself a new one.
+        The whole menu is drawn again when it is activated.
+
+        A menu only receives the mouse events of the event bus while it is active, so
+        that inactive menus cost nothing and can be garbage collected.
+        """
         super().__init__(game, on_unload)
-        self.background = pygame.image.load(bg)
+        self.background = asset_manager.load(bg)
         self.background = pygame.transform.scale(self.background, game.screen.get_size())
 
         self.widgets = pygame.sprite.Group()
+        self._activation = 0
+        # the last state drawn, only used by self.draw():
+        self._drawn: MenuState or None = None
+
+    @property
+    def active(self):
+        return self._active
+
+    @active.setter
+    def active(self, value: bool):
+        if value and not self._active:
+            self._activation += 1
+            for event_type in _MOUSE_EVENTS:
+                self.game.events.subscribe(event_type, self.handle_event)
+        elif self._active and not value:
+            for event_type in _MOUSE_EVENTS:
+                self.game.events.unsubscribe(event_type, self.handle_event)
+        GUI.active.fset(self, value)
+
+    def handle_event(self, event: pygame.event.Event, game):
+        """
+        Hand the mouse event 'event' to the widgets of self that handle events, if self is active.
+        """
+        for widget in self.widgets.sprites():
+            if not self._active:
+                # a widget's command may have closed self
+                return
+            if hasattr(widget, "handle_event"):
+                widget.handle_event(event)
 
     def update(self, screen, *args, **kwargs) -> None:
+        self.draw(screen, self.capture(), 1.0)
+        self.simulate()
+
+    def simulate(self):
         if self._active:
-            screen.blit(self.background, (0, 0), screen.get_rect())
-            self.widgets.draw(screen)
-            self.widgets.update(screen, *args, **kwargs)
-        pygame.display.flip()
+            self.widgets.update(self.game.screen)
         if self.RegistryName != ("", ""):
             self._register_update()
 
+    def capture(self) -> MenuState:
+        widgets = tuple((widget, widget.image, tuple(widget.rect)) for widget in self.widgets.sprites())
+        return MenuState(self.background, widgets, self._activation)
+
+    def draw(self, screen: pygame.Surface, state: MenuState or None, alpha: float):
+        if state is None:
+            return
+        drawn, self._drawn = self._drawn, state
+        if drawn is None or drawn.activation != state.activation or drawn.background is not state.background:
+            screen.blit(state.background, (0, 0))
+            for key, image, rect in state.widgets:
+                screen.blit(image, rect)
+            self.game.compositor.invalidate()
+            return
+
+        previous = {key: (image, rect) for key, image, rect in drawn.widgets}
+        dirty = []
+        for key, image, rect in state.widgets:
+            previous_image, previous_rect = previous.pop(key, (None, None))
+            if previous_image is not image or previous_rect != rect:
+                dirty.append(pygame.Rect(rect))
+                if previous_rect is not None and previous_rect != rect:
+                    dirty.append(pygame.Rect(previous_rect))
+        # widgets that were removed since:
+        dirty.extend(pygame.Rect(rect) for image, rect in previous.values())
+        if not dirty:
+            return
+
+        for area in dirty:
+            screen.set_clip(area)
+            screen.blit(state.background, area, area)
+            for key, image, rect in state.widgets:
+                if area.colliderect(rect):
+                    screen.blit(image, rect)
+        screen.set_clip(None)
+        self.game.compositor.add_dirty(*dirty)
+
     def add(self, widget: pygame.sprite.Sprite):
         self.widgets.add(widget)
-
-
@@ -1,11 +1,40 @@
-import imp
+import sys
+import importlib.util
 from os import PathLike
 
 
 def import_module(name: str, path: str or PathLike):
+    """
+    Import the python file at 'path' as the module 'name', and return it.
+    The module is compiled through importlib's source loader, so its bytecode
+    is cached in a __pycache__ directory next to it.
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    if spec is None:
+        raise ImportError(f"Can't import module '{name}' from '{path}'.")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except:
+        del sys.modules[name]
+        raise
+    return module
 
-    details = ("." + path.split('.')[len(path.split('.')) - 1], 'r', 1)
 
-    f_data = (open(path, 'r'), path, details)
-
-    return imp.load_module(name, *f_data)
+def lazy_import(name: str):
+    """
+    Return the module 'name', but only actually import it the first time one of its
+    attributes is accessed. Used to defer the import of heavy dependencies.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'.")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,7 +1,11 @@
 from typing import Literal, Final
+from os import PathLike
+import os
 import sys
 import time
-import pygame
+import queue
+import atexit
+import threading
 
 
 class ConsoleColor:
@@ -31,23 +35,188 @@ class ConsoleColor:
             raise NotImplementedError("This function is only implemented on Windows!")
 
 
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+
+_level = INFO
+
+
+def set_level(level: int):
+    """
+    Only log the records of level 'level' or higher. Records below it are dropped
+    before being formatted.
+    """
+    global _level
+    _level = level
+
+
+def get_level() -> int:
+    return _level
+
+
+class ConsoleSink:
+    def __init__(self, colored=True):
+        """
+        Writes log records to the file they were logged to (the console by default),
+        colored with ANSI codes if 'colored' is set.
+        """
+        self.colored = colored
+
+    def write(self, stream: "Ostream", line: str, file, created: float):
+        if self.colored:
+            file.write(stream.color.activate_color + line + stream.color.reset_color)
+        else:
+            file.write(line)
+
+    def flush(self, file):
+        file.flush()
+
+    def close(self): pass
+
+
+class RotatingFileSink:
+    def __init__(self, path: str or PathLike, max_bytes: int = 1024 * 1024, backup_count: int = 3):
+        """
+        Writes log records to the file 'path', with their time and without colors.
+        When the file would grow over 'max_bytes', it is renamed to 'path.1' (the
+        previous 'path.1' to 'path.2', and so on, keeping 'backup_count' of them)
+        and a new file is started.
+        """
+        self.path = os.fspath(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def write(self, stream: "Ostream", line: str, file, created: float):
+        line = time.strftime("%Y-%m-%d %H:%M:%S ", time.localtime(created)) + line
+        if self._file.tell() + len(line) > self.max_bytes and self._file.tell() > 0:
+            self._rotate()
+        self._file.write(line)
+
+    def flush(self, file):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+_sinks: list = [ConsoleSink()]
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_worker: threading.Thread or None = None
+_worker_lock = threading.Lock()
+
+
+def add_sink(sink):
+    """
+    Also write the log records to 'sink', e.g. a RotatingFileSink.
+    """
+    flush()
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    flush()
+    _sinks.remove(sink)
+    sink.close()
+
+
+def _format(stream: "Ostream", text, args: tuple, sep: str, end: str) -> str:
+    """
+    Internal function that formats a log record. A record that can't be converted to
+    text is replaced by a line saying so, instead of stopping the logger thread.
+    """
+    try:
+        final = [f"[{stream._name}] ", str(text)]
+        for arg in args:
+            final.append(str(sep))
+            final.append(str(arg))
+        final.append(str(end))
+        return "".join(final)
+    except Exception as error:
+        return f"[{stream._name}] <unprintable log record: {type(error).__name__}: {error}>\n"
+
+
+def _write_loop():
+    """
+    Internal function run by the logger thread: formats and writes the queued records.
+    """
+    while True:
+        record = _queue.get()
+        if isinstance(record, threading.Event):
+            for sink in _sinks:
+                try:
+                    sink.flush(sys.stdout)
+                except (OSError, ValueError):
+                    pass
+            record.set()
+            continue
+
+        stream, text, args, sep, end, file, created = record
+        line = _format(stream, text, args, sep, end)
+        for sink in _sinks:
+            try:
+                sink.write(stream, line, file, created)
+            except (OSError, ValueError):
+                pass
+
+
+def _start_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_write_loop, name="Logger-Thread", daemon=True)
+            _worker.start()
+
+
+def flush(timeout: float = 5.0):
+    """
+    Block until every record logged so far has been written.
+    """
+    if _worker is None:
+        return
+    if not _worker.is_alive():
+        _start_worker()
+    done = threading.Event()
+    _queue.put(done)
+    done.wait(timeout)
+
+
+_flush = flush
+atexit.register(flush)
+
+
 class Ostream:
-    def __init__(self, color: ConsoleColor, OriginName: str):
+    def __init__(self, color: ConsoleColor, OriginName: str, level: int = INFO):
+        """
+        A named output stream for log records of level 'level'.
+        Logging only queues the record: it is formatted and written by the
+        logger's background thread, to every sink (see add_sink()).
+        """
         self.color = color
         self._name = OriginName
-
-    def _writeline(self, text, file):
-        file.write(self.color.activate_color + text + self.color.reset_color)
+        self.level = level
 
     def log(self, text, *args, sep="", end="\n", file=sys.stdout, flush=False):
-        final = f"[{self._name}] " + str(text)
-        for arg in args:
-            final += sep
-            final += str(arg)
-        final += end
-        self._writeline(final, file)
+        if self.level < _level:
+            return
+        if _worker is None or not _worker.is_alive():
+            _start_worker()
+        _queue.put((self, text, args, sep, end, file, time.time()))
         if flush:
-            file.flush()
+            _flush()
 
 
 BLACK = ConsoleColor(30)
@@ -60,14 +229,15 @@ CYAN = ConsoleColor(36)
 WHITE = ConsoleColor(37)
 
 
-RenderThreadInfo: Final[Ostream] = Ostream(MAGENTA, "Main-Thread/Info")
-RenderThreadWarn: Final[Ostream] = Ostream(YELLOW, "Main-Thread/Warn")
-RenderThreadError: Final[Ostream] = Ostream(RED, "Main-Thread/Error")
+RenderThreadInfo: Final[Ostream] = Ostream(MAGENTA, "Main-Thread/Info", INFO)
+RenderThreadWarn: Final[Ostream] = Ostream(YELLOW, "Main-Thread/Warn", WARN)
+RenderThreadError: Final[Ostream] = Ostream(RED, "Main-Thread/Error", ERROR)
 
 
 def crash(reason="Fatal Error"):
+    import pygame
     time.sleep(2)
-    RenderThreadError.log(f"The game was found in crash state: {reason}.\nStopping...")
+    RenderThreadError.log(f"The game was found in crash state: {reason}.\nStopping...", flush=True)
     time.sleep(5)
     pygame.quit()
     sys.exit()
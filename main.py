@@ -1,7 +1,11 @@
-import pygame
-import mod_data
-import game
-import logger
+import startup
+
+with startup.profile.phase("import logger"):
+    import logger
+with startup.profile.phase("import mod_data"):
+    import mod_data
+with startup.profile.phase("import game"):
+    import game
 
 
 def make_list_displayable(list_: dict):
@@ -16,8 +20,10 @@ if __name__ == '__main__':
     logger.RenderThreadInfo.log("Launching the game...")
 
     logger.RenderThreadInfo.log("Scanning for mods...")
-    mods_info = mod_data.check_mods()
-    modlist = mod_data.import_mods(mods_info)
+    with startup.profile.phase("scan mods"):
+        mods_info = mod_data.check_mods()
+    with startup.profile.phase("import mods"):
+        modlist = mod_data.import_mods(mods_info)
 
     modlist_d = make_list_displayable(modlist)
     len_ = len(modlist_d)
@@ -26,4 +32,3 @@ if __name__ == '__main__':
 
     logger.RenderThreadInfo.log("Successfully loaded mods. Launching GUIs...")
     game_ = game.Game(modlist)
-
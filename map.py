@@ -1,31 +1,156 @@
 from os import PathLike
+import sys
+import threading
+from typing import NamedTuple, Any
 import pygame
-import pytmx
-import pyscroll
 from tools import Registry
 import logger
 import entity
+import const
+import thread
+import mapcache
+import importer
+import ai
+from spatial import SpatialHash, SweepAndPrune
+from navigation import NavGrid
+
+pytmx = importer.lazy_import("pytmx")
+pyscroll = importer.lazy_import("pyscroll")
+
+
+class FrameState(NamedTuple):
+    """
+    What a map shows at the end of a simulation step: the camera's center and zoom,
+    and for each sprite its key, image, position and layer. Plain values only, so that
+    it can be drawn later, interpolated with the state of the previous step.
+    """
+    center: tuple[int, int]
+    zoom: float
+    sprites: tuple[tuple[Any, pygame.Surface, int, int, int], ...]
+
+
+def _lerp(a: float, b: float, alpha: float) -> int:
+    return round(a + (b - a) * alpha)
+
+
+class MapData:
+    def __init__(self, tmx_data: "pytmx.TiledMap", collide_hitboxes: list[pygame.Rect] = None):
+        """
+        Everything about a map that can be built without pygame's display:
+        its parsed TMX data, its collision hitboxes and its navigation grid.
+        If 'collide_hitboxes' is not given, it is derived from the map's objects.
+        """
+        self.tmx_data = tmx_data
+        if collide_hitboxes is None:
+            collide_hitboxes = []
+            for obj in tmx_data.objects:
+                if obj.type == 'collision':
+                    collide_hitboxes.append(pygame.Rect(obj.x, obj.y, obj.width, obj.height))
+        self.collide_hitboxes = collide_hitboxes
+        self.collision_grid = SpatialHash(self.collide_hitboxes, const.COLLISION_CELL_SIZE)
+        tile_size = tmx_data.tilewidth, tmx_data.tileheight
+        map_size = tmx_data.width * tmx_data.tilewidth, tmx_data.height * tmx_data.tileheight
+        self.navigation = NavGrid.from_hitboxes(self.collide_hitboxes, map_size, tile_size, const.NAV_AGENT_SIZE)
+
+
+def load_map_data(tmx: str or PathLike) -> MapData:
+    """
+    Parse the 'tmx' file and its tilesets. Safe to call from another thread.
+    If const.MAP_CACHE is set, the map is read from its compiled cache when it is up to date,
+    and the cache is (re)built otherwise.
+    """
+    if not const.MAP_CACHE:
+        return MapData(pytmx.util_pygame.load_pygame(tmx))
+
+    cached = mapcache.load(tmx)
+    if cached is not None:
+        tmx_data, collide_hitboxes = cached
+        data = MapData(tmx_data, collide_hitboxes)
+    else:
+        data = MapData(pytmx.TiledMap(tmx))
+        mapcache.save(tmx, data.tmx_data, data.collide_hitboxes)
+    mapcache.load_images(data.tmx_data)
+    return data
+
+
+class MapLoader:
+    def __init__(self, tmx: str or PathLike, center: tuple[int, int], zoom, on_loaded: callable):
+        """
+        Loads the map 'tmx' on a worker thread.
+        When it is done, the game builds the MapTMX on the main thread and calls 'on_loaded' with it.
+        See Game.new_map_async() .
+        """
+        self.tmx = tmx
+        self.center = center
+        self.zoom = zoom
+        self.on_loaded = on_loaded
+        self.stage = "waiting"
+        self.progress = 0.0
+        self.data: MapData or None = None
+        self.error = None
+        self._done = threading.Event()
+        self._worker = thread.thread(self._run)
+
+    def start(self):
+        # make sure the lazily imported map libraries are imported by the main thread:
+        pytmx.TiledMap, pyscroll.PyscrollGroup
+        self.stage = "parsing"
+        self.progress = 0.1
+        self._worker()
+
+    def _run(self):
+        try:
+            self.data = load_map_data(self.tmx)
+            self.stage = "building"
+            self.progress = 0.9
+        except:
+            self.error = sys.exc_info()
+        finally:
+            self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until the worker thread is done, or until 'timeout' seconds passed.
+        Return True if it is done.
+        """
+        return self._done.wait(timeout)
 
 
 class MapTMX:
-    def __init__(self, tmx: str or PathLike, function_unload, game, center: tuple[int, int], zoom):
+    def __init__(self, tmx: str or PathLike or MapData, function_unload, game, center: tuple[int, int], zoom):
         self.on_unload = function_unload
         self.game = game
         self._center_entity = None
         self._active = False
-        self._tmx_data = pytmx.util_pygame.load_pygame(tmx)
+        if not isinstance(tmx, MapData):
+            tmx = load_map_data(tmx)
+        self._tmx_data = tmx.tmx_data
         data = pyscroll.data.TiledMapData(self._tmx_data)
+        # the renderer is only used by self.draw(), that may run on another thread than the
+        # simulation: the simulation keeps its own camera, that self.capture() hands to it.
         self.map_layer = pyscroll.orthographic.BufferedRenderer(data, game.screen.get_size())
         self.map_layer.center(center)
         self.map_layer.zoom = zoom
         self.layers = pyscroll.PyscrollGroup(map_layer=self.map_layer, default_layer=5)
-        self.center = self.map_layer.center
+        self.camera: tuple[int, int] = tuple(center)
+        self._zoom = zoom
+        self._screen_size = game.screen.get_size()
+        self._map_rect = self.map_layer.map_rect.copy()
+        self._clamp_camera = self.map_layer.clamp_camera
         self.RegistryName = ""
 
-        self.collide_hitboxes = []
-        for obj in self.list_objects():
-            if obj.type == 'collision':
-                self.collide_hitboxes.append(pygame.Rect(obj.x, obj.y, obj.width, obj.height))
+        self.collide_hitboxes = tmx.collide_hitboxes
+        self.collision_grid = tmx.collision_grid
+        self.navigation = tmx.navigation
+        self._moving_sprites = pygame.sprite.Group()
+        self._entity_sweep = SweepAndPrune(lambda sprite: sprite.feet)
+        self.crowds = []
+        self.previous_state: FrameState or None = None
+        self.state: FrameState or None = None
 
     def get_object_by_name(self, name: str):
         return self._tmx_data.get_object_by_name(name)
@@ -35,27 +160,188 @@ class MapTMX:
 
     def link_sprite(self, sprite: pygame.sprite.Sprite, center=False):
         self.layers.add(sprite)
+        if isinstance(sprite, entity.MovingEntity):
+            self._moving_sprites.add(sprite)
+            self._entity_sweep.add(sprite)
+        if getattr(sprite, "ai_driven", False):
+            # start the AI workers now rather than in the middle of a tick:
+            self.game.ai.warm_up()
         if center:
             self._center_entity = sprite
 
+    def link_crowd(self, crowd):
+        """
+        Simulate and draw the crowd.Crowd 'crowd' on this map.
+        """
+        self.crowds.append(crowd)
+
     def update(self, screen, *args, **kwargs):
+        """
+        Run one simulation step of self, and draw it.
+        """
+        if self._active:
+            self.simulate()
+            self.draw(screen, self.previous_state, self.state, 1.0)
+
+    def simulate(self):
+        """
+        Run one simulation step of self: apply the decisions of its AI-driven NPCs,
+        update its entities and crowds, and handle their collisions. Then capture the resulting state into
+        self.state, and keep the one of the previous step in self.previous_state.
+        """
         if self._active:
-            self.layers.draw(screen)
-            self.layers.update(screen)
-            self.handle_collisions()
+            profiler = self.game.profiler
+            with profiler.phase("map:ai"):
+                # steer from the positions the previous tick's intents lead to:
+                self.game.ai.collect()
+                self.steer()
+                self.game.ai.submit(self._moving_sprites)
+            with profiler.phase("map:entities"):
+                self.layers.update(self.game.screen)
+            if self.crowds:
+                with profiler.phase("map:crowds"):
+                    for crowd in self.crowds:
+                        crowd.step()
+            with profiler.phase("map:collisions"):
+                self.handle_collisions()
+
+            view = self.camera_view()
+            self.camera = view.center
+            for crowd in self.crowds:
+                crowd.sync(self.layers, view)
+            self.previous_state, self.state = self.state, self.capture(view)
+
+    def steer(self):
+        """
+        Give every sprite that has a goal the direction to take to reach it from its
+        feet, avoiding the collision hitboxes, or no direction once it arrived.
+        NPCs heading to the same goal share the same distance field of self.navigation.
+        """
+        navigation = self.navigation
+        for sprite in self._moving_sprites:
+            goal = getattr(sprite, "goal", None)
+            if goal is None:
+                continue
+            x, y = sprite.feet.center
+            if ai.arrived(goal[0] - x, goal[1] - y, sprite.speed):
+                sprite.route = None
+            else:
+                sprite.route = navigation.next_direction((x, y), (goal,), sprite.speed)
+
+    def center(self, xy: tuple[int, int]):
+        """
+        Center the camera on the point 'xy' of self.
+        """
+        self.camera = round(xy[0]), round(xy[1])
+
+    def camera_view(self) -> pygame.Rect:
+        """
+        Return the area of self the camera shows: centered on the sprite linked
+        with center=True if there is one (on self.camera otherwise), and kept inside
+        self if pyscroll does so. It is computed from the screen's size and self.zoom,
+        without reading the renderer, that only self.draw() uses.
+        """
+        width, height = self._screen_size
+        view = pygame.Rect(0, 0, int(width / self._zoom), int(height / self._zoom))
+        if self._center_entity is not None:
+            view.center = self._center_entity.rect.center
+        else:
+            view.center = self.camera
+        if self._clamp_camera:
+            view.clamp_ip(self._map_rect)
+        return view
 
-            self.handle_center_on_sprite()
+    def capture(self, view: pygame.Rect = None) -> FrameState:
+        """
+        Return the current state of self, as it should be drawn, seen by the camera 'view'
+        (self.camera_view() by default).
+        """
+        if view is None:
+            view = self.camera_view()
+        layer_of = self.layers.get_layer_of_sprite
+        sprites = tuple((getattr(sprite, "key", sprite), sprite.image, sprite.rect.x, sprite.rect.y, layer_of(sprite))
+                        for sprite in self.layers.sprites())
+        return FrameState(view.center, self._zoom, sprites)
+
+    def draw(self, screen, previous: FrameState or None, current: FrameState or None, alpha: float):
+        """
+        Draw self on 'screen' as it is between the states 'previous' and 'current',
+        'alpha' being the fraction of the simulation step elapsed since 'current' (0 to 1).
+        Sprites that are not in 'previous' are drawn where they are in 'current'.
+        """
+        if current is None or not self._active:
+            return
+        if previous is None:
+            previous = current
+
+        with self.game.profiler.phase("map:draw"):
+            if self.map_layer.zoom != current.zoom:
+                self.map_layer.zoom = current.zoom
+            (previous_x, previous_y), (center_x, center_y) = previous.center, current.center
+            self.map_layer.center((_lerp(previous_x, center_x, alpha), _lerp(previous_y, center_y, alpha)))
+            ox, oy = self.map_layer.get_center_offset()
+            view = self.map_layer.view_rect
+
+            previous_positions = {key: (x, y) for key, image, x, y, layer in previous.sprites}
+            surfaces = []
+            for key, image, x, y, layer in current.sprites:
+                px, py = previous_positions.get(key, (x, y))
+                rect = image.get_rect(topleft=(_lerp(px, x, alpha), _lerp(py, y, alpha)))
+                if rect.colliderect(view):
+                    surfaces.append((image, rect.move(ox, oy), layer))
+            self.map_layer.draw(screen, screen.get_rect(), surfaces)
+        self.game.compositor.invalidate()
 
     def handle_collisions(self):
-        for sprite in self.layers.sprites():
-            if isinstance(sprite, entity.MovingEntity):
-                if sprite.feet.collidelist(self.collide_hitboxes) > -1:
-                    sprite.__cancel_move__()
+        """
+        Cancel the last move of every sprite that moved into a collision hitbox, or
+        whose feet moved onto the feet of another moving sprite. Sprites whose feet
+        already overlapped before they moved keep their moves, so that they can separate.
+        Only sprites that moved since the last call are tested against the hitboxes.
+        """
+        moved = [sprite for sprite in self._moving_sprites if sprite.moved]
+        if not moved:
+            return
+
+        for sprite in moved:
+            if self.collision_grid.collides(sprite.feet):
+                self._cancel_move(sprite)
+
+        if len(self._entity_sweep) != len(self._moving_sprites):
+            # some sprites were killed since the last call:
+            self._entity_sweep.retain(self._moving_sprites)
+        for first, second in self._entity_sweep.pairs():
+            if self._feet_before_move(first).colliderect(self._feet_before_move(second)):
+                continue
+            if first.moved:
+                self._cancel_move(first)
+            if second.moved:
+                self._cancel_move(second)
+
+        for sprite in moved:
+            sprite.moved = False
+
+    @staticmethod
+    def _feet_before_move(sprite: "entity.MovingEntity") -> pygame.Rect:
+        """
+        Internal method that returns where the feet of 'sprite' were before its last move.
+        """
+        if not sprite.moved:
+            return sprite.feet
+        x, y = sprite.old_position
+        return sprite.feet.move(x - sprite.rect.x, y - sprite.rect.y)
+
+    @staticmethod
+    def _cancel_move(sprite: "entity.MovingEntity"):
+        """
+        Internal method that cancels the last move of 'sprite' and puts its feet back under it.
+        """
+        sprite.__cancel_move__()
+        sprite.feet.midbottom = sprite.rect.midbottom
 
     def handle_center_on_sprite(self):
         if self._center_entity is not None:
-            self.layers.center(self._center_entity.rect.center)
-        pygame.display.flip()
+            self.center(self._center_entity.rect.center)
 
     @property
     def active(self):
@@ -65,15 +351,21 @@ class MapTMX:
     def active(self, value: bool):
         if not value:
             self.on_unload(self, self.game.win, self.game)
+        elif not self._active:
+            # don't interpolate from the states of the last time self was active:
+            self.previous_state = self.state = None
         self._active = value
 
     @property
     def zoom(self):
-        return self.map_layer.zoom
+        return self._zoom
 
     @zoom.setter
     def zoom(self, value: int):
-        self.map_layer.zoom = value
+        if value <= 0:
+            raise ValueError("The zoom level must be greater than 0.")
+        # the renderer follows at the next self.draw():
+        self._zoom = value
 
     def register(self, name: str, module):
         self.RegistryName = module, name
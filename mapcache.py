@@ -0,0 +1,264 @@
+import os
+import io
+import re
+import sys
+import mmap
+import array
+import struct
+import pickle
+import hashlib
+from os import PathLike
+import pygame
+import logger
+import importer
+
+pytmx = importer.lazy_import("pytmx")
+
+
+MAGIC = b"KKMAPC"
+VERSION = 1
+SUFFIX = ".cache"
+
+_HEADER = struct.Struct("<6sHH")         # magic, version, amount of dependencies
+_DEPENDENCY = struct.Struct("<qQ20sH")   # mtime_ns, size, sha1, length of the path that follows
+_MTIME = struct.Struct("<q")             # the mtime_ns at the start of a dependency
+_SECTION_COUNT = struct.Struct("<I")
+_SECTION = struct.Struct("<4sQQ")        # tag, offset, length
+_LAYER = struct.Struct("<III")           # index in TiledMap.layers, width, height
+_RECT = struct.Struct("<iiii")
+
+_TILESET_SOURCE = re.compile(rb'<tileset\b[^>]*\bsource="([^"]+)"')
+
+
+def _new(cls: type):
+    return cls.__new__(cls)
+
+
+def _set_state(obj, state: dict):
+    obj.__dict__.update(state)
+
+
+class _TiledPickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        """
+        pytmx's elements look their missing attributes up in their properties, which breaks
+        pickle's default protocol. Rebuild them from their __dict__ instead.
+        """
+        if isinstance(obj, pytmx.TiledElement):
+            items = iter(obj) if isinstance(obj, list) else None
+            return _new, (type(obj),), obj.__dict__, items, None, _set_state
+        return NotImplemented
+
+
+def cache_path(tmx: str or PathLike) -> str:
+    """
+    Return the path of the compiled cache of the map 'tmx'.
+    """
+    return os.fspath(tmx) + SUFFIX
+
+
+def _sha1(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).digest()
+
+
+def _dependencies(tmx: str) -> list[str]:
+    """
+    Internal function that returns the paths of the files the map 'tmx' is built from:
+    the TMX file itself and its external tilesets.
+    """
+    with open(tmx, "rb") as file:
+        content = file.read()
+    directory = os.path.dirname(tmx)
+    result = [tmx]
+    for source in _TILESET_SOURCE.findall(content):
+        result.append(os.path.normpath(os.path.join(directory, source.decode("utf-8"))))
+    return result
+
+
+def _fresh_mtime(path: str, mtime_ns: int, size: int, sha1: bytes) -> int or None:
+    """
+    Internal function that checks whether the file 'path' is still the one a cache was built from,
+    and returns its current modification time if so, None otherwise.
+    The modification time is checked first, and the content hash only if it changed.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if stat.st_size != size:
+        return None
+    if stat.st_mtime_ns == mtime_ns or _sha1(path) == sha1:
+        return stat.st_mtime_ns
+    return None
+
+
+def _refresh_mtimes(path: str, touched: list[tuple[int, int]]):
+    """
+    Internal function that writes into the cache 'path' the new modification times 'touched',
+    as (offset of the dependency, mtime_ns) pairs, of the dependencies that were touched without
+    being changed, so that the next loads recognise them without hashing them again.
+    """
+    try:
+        with open(path, "r+b") as file:
+            for offset, mtime_ns in touched:
+                file.seek(offset)
+                file.write(_MTIME.pack(mtime_ns))
+    except OSError as error:
+        logger.RenderThreadWarn.log(f"Could not update the map cache '{path}': {error}.")
+
+
+def _tile_layers(tmx_data: "pytmx.TiledMap") -> list[tuple[int, "pytmx.TiledTileLayer"]]:
+    return [(i, layer) for i, layer in enumerate(tmx_data.layers) if isinstance(layer, pytmx.TiledTileLayer)]
+
+
+def _to_little_endian(values: array.array) -> bytes:
+    if sys.byteorder == "big":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def save(tmx: str or PathLike, tmx_data: "pytmx.TiledMap", collide_hitboxes: list[pygame.Rect]):
+    """
+    Compile the map 'tmx' into a binary cache file next to it.
+    'tmx_data' must have been parsed without loading its images (pytmx's default image loader).
+
+    The file holds, in separate sections, the collision rectangles and the tile layers'
+    data as packed little-endian integer arrays, and the rest of the parsed map (tilesets,
+    object groups and properties) as a pickle.
+    """
+    tmx = os.fspath(tmx)
+    try:
+        dependencies = _dependencies(tmx)
+    except OSError:
+        return
+
+    layers = _tile_layers(tmx_data)
+    layer_data = [layer.data for i, layer in layers]
+    images, image_loader = tmx_data.images, tmx_data.image_loader
+    try:
+        # tile data and images are stored separately or reloaded, so leave them out of the pickle:
+        for i, layer in layers:
+            layer.data = None
+        tmx_data.images, tmx_data.image_loader = [], None
+        buffer = io.BytesIO()
+        _TiledPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(tmx_data)
+        pickled = buffer.getvalue()
+    finally:
+        for (i, layer), data in zip(layers, layer_data):
+            layer.data = data
+        tmx_data.images, tmx_data.image_loader = images, image_loader
+
+    collisions = b"".join(_RECT.pack(rect.x, rect.y, rect.w, rect.h) for rect in collide_hitboxes)
+
+    tiles = bytearray()
+    for i, layer in layers:
+        tiles += _LAYER.pack(i, layer.width, layer.height)
+        tiles += _to_little_endian(array.array("I", (gid for row in layer.data for gid in row)))
+
+    header = bytearray(_HEADER.pack(MAGIC, VERSION, len(dependencies)))
+    directory = os.path.dirname(tmx)
+    for path in dependencies:
+        stat = os.stat(path)
+        relative = os.path.relpath(path, directory or os.curdir).encode("utf-8")
+        header += _DEPENDENCY.pack(stat.st_mtime_ns, stat.st_size, _sha1(path), len(relative))
+        header += relative
+
+    sections = ((b"COLL", collisions), (b"LAYR", bytes(tiles)), (b"TMAP", pickled))
+    offset = len(header) + _SECTION_COUNT.size + _SECTION.size * len(sections)
+    header += _SECTION_COUNT.pack(len(sections))
+    for tag, data in sections:
+        header += _SECTION.pack(tag, offset, len(data))
+        offset += len(data)
+
+    path = cache_path(tmx)
+    try:
+        with open(path + ".tmp", "wb") as file:
+            file.write(header)
+            for tag, data in sections:
+                file.write(data)
+        os.replace(path + ".tmp", path)
+    except OSError as error:
+        logger.RenderThreadWarn.log(f"Could not write the map cache '{path}': {error}.")
+
+
+def load(tmx: str or PathLike) -> tuple["pytmx.TiledMap", list[pygame.Rect]] or None:
+    """
+    Load the compiled cache of the map 'tmx', and return its parsed map (without images)
+    and its collision rectangles. Return None if there is no cache, or if it is out of date.
+    """
+    tmx = os.fspath(tmx)
+    path = cache_path(tmx)
+    touched = []
+    try:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            result = _read(tmx, view, touched)
+    except (OSError, ValueError):
+        return None
+    except Exception as error:
+        logger.RenderThreadWarn.log(f"Ignoring unreadable map cache '{path}': {error}.")
+        return None
+    if result is not None and touched:
+        _refresh_mtimes(path, touched)
+    return result
+
+
+def _read(tmx: str, view: mmap.mmap, touched: list[tuple[int, int]]) -> tuple["pytmx.TiledMap", list[pygame.Rect]] or None:
+    """
+    Internal function that decodes the map cache of 'tmx' mapped in memory as 'view'.
+    The dependencies whose modification time changed but not their content are added to
+    'touched', as (offset of the dependency, new mtime_ns) pairs.
+    """
+    magic, version, dependency_count = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version != VERSION:
+        return None
+
+    offset = _HEADER.size
+    directory = os.path.dirname(tmx)
+    for i in range(dependency_count):
+        mtime_ns, size, sha1, length = _DEPENDENCY.unpack_from(view, offset)
+        relative = view[offset + _DEPENDENCY.size:offset + _DEPENDENCY.size + length].decode("utf-8")
+        current = _fresh_mtime(os.path.join(directory, relative), mtime_ns, size, sha1)
+        if current is None:
+            return None
+        if current != mtime_ns:
+            touched.append((offset, current))
+        offset += _DEPENDENCY.size + length
+
+    sections = {}
+    section_count, = _SECTION_COUNT.unpack_from(view, offset)
+    offset += _SECTION_COUNT.size
+    for i in range(section_count):
+        tag, start, length = _SECTION.unpack_from(view, offset)
+        offset += _SECTION.size
+        sections[tag] = start, length
+
+    start, length = sections[b"TMAP"]
+    tmx_data: pytmx.TiledMap = pickle.loads(view[start:start + length])
+    tmx_data.filename = tmx
+
+    start, length = sections[b"LAYR"]
+    end = start + length
+    while start < end:
+        index, width, height = _LAYER.unpack_from(view, start)
+        start += _LAYER.size
+        gids = array.array("I")
+        gids.frombytes(view[start:start + width * height * gids.itemsize])
+        if sys.byteorder == "big":
+            gids.byteswap()
+        start += width * height * gids.itemsize
+        tmx_data.layers[index].data = [gids[y * width:(y + 1) * width] for y in range(height)]
+
+    start, length = sections[b"COLL"]
+    collide_hitboxes = [pygame.Rect(*_RECT.unpack_from(view, position))
+                        for position in range(start, start + length, _RECT.size)]
+    return tmx_data, collide_hitboxes
+
+
+def load_images(tmx_data: "pytmx.TiledMap"):
+    """
+    Load the tile images of 'tmx_data' with pytmx's pygame image loader.
+    """
+    tmx_data.image_loader = pytmx.util_pygame.pygame_image_loader
+    tmx_data.reload_images()
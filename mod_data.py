@@ -1,29 +1,131 @@
 import os
-from importlib import util
+import json
+import time
+import importlib
 import importer
+import logger
 
 
-def check_mods():
-    realpath = os.path.realpath(os.curdir)
+MODS_DIRECTORY = "mods"
+
+load_times: dict[str, float] = {}
+"""How long importing each mod took, in seconds."""
+
 
-    os.chdir("mods/")
+def check_mods():
     mods = []
 
-    for file in os.listdir():
+    for file in sorted(os.listdir(MODS_DIRECTORY)):
         if file.endswith('.py'):
             mod_name = file.split('.py')[0]
             mods.append(mod_name)
 
-    os.chdir(realpath)
-
     return mods
 
 
+def read_manifest(modname: str) -> dict or None:
+    """
+    Return the manifest of the mod 'modname' (the content of 'mods/<modname>.json'),
+    or None if it has none. A manifest lists the triggers overridden by the mod, e.g. :
+
+        {"triggers": ["game:OnGameStarts", "game:OnReadyToLoadMap"]}
+    """
+    path = os.path.join(MODS_DIRECTORY, f"{modname}.json")
+    try:
+        with open(path, "r") as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        return None
+    except ValueError as error:
+        logger.RenderThreadWarn.log(f"Ignoring invalid manifest '{path}': {error}.")
+        return None
+    if not isinstance(manifest.get("triggers"), list):
+        logger.RenderThreadWarn.log(f"Ignoring manifest '{path}': it has no 'triggers' list.")
+        return None
+    return manifest
+
+
+def find_trigger(name: str):
+    """
+    Return the trigger named 'name', in the form "<module>:<trigger>", e.g. "game:OnGameStarts".
+    """
+    module, sep, trigger = name.partition(":")
+    if not sep:
+        raise ValueError(f"Invalid trigger name '{name}', expected '<module>:<trigger>'.")
+    return getattr(importlib.import_module(module), trigger)
+
+
+class LazyMod:
+    def __init__(self, name: str, path: str, triggers: list[str]):
+        """
+        A mod that is only imported when one of the triggers 'triggers' it overrides is first
+        fired, or when one of its attributes is accessed.
+        """
+        self.name = name
+        self.path = path
+        self.triggers = triggers
+        self._module = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self):
+        """
+        Import the mod if it was not imported yet, and return its module.
+        """
+        if self._module is None:
+            self._module = load_mod(self.name, self.path)
+        return self._module
+
+    def __getattr__(self, item):
+        return getattr(self.load(), item)
+
+    def __repr__(self):
+        return f"<lazy mod '{self.name}' ({'loaded' if self.loaded else 'not loaded'})>"
+
+
+def load_mod(modname: str, path: str):
+    """
+    Import the mod 'modname' from 'path', and record how long it took.
+    """
+    start = time.perf_counter()
+    module = importer.import_module(modname, path)
+    load_times[modname] = time.perf_counter() - start
+    logger.RenderThreadInfo.log(f"Loaded mod '{modname}' in {load_times[modname] * 1000:.3f}ms.")
+    return module
+
+
 def import_mods(mods_info: list[str]):
+    """
+    Import the mods 'mods_info'. Mods that have a manifest are not imported yet: they
+    are deferred until one of the triggers listed in their manifest is first fired.
+    Triggers of a manifest that can't be found are ignored, and a mod none of whose
+    triggers can be found is imported right away.
+    """
     modlist = {}
     for modname in mods_info:
+        path = os.path.join(MODS_DIRECTORY, f"{modname}.py")
+        manifest = read_manifest(modname)
 
-        modlist[modname] = importer.import_module(modname, f"mods\\{modname}.py")
+        if manifest is None:
+            modlist[modname] = load_mod(modname, path)
+            continue
 
-    return modlist
+        lazy_mod = LazyMod(modname, path, manifest["triggers"])
+        deferred = False
+        for trigger in lazy_mod.triggers:
+            try:
+                find_trigger(trigger).defer(lazy_mod.load)
+            except (ValueError, ImportError, AttributeError) as error:
+                logger.RenderThreadWarn.log(f"Mod '{modname}': ignoring trigger '{trigger}' of its manifest: "
+                                            f"{str(error).rstrip('.')}.")
+                continue
+            deferred = True
+        if not deferred:
+            # nothing would ever load it:
+            modlist[modname] = load_mod(modname, path)
+            continue
+        modlist[modname] = lazy_mod
 
+    return modlist
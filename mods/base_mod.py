@@ -61,7 +61,7 @@ class PlayerEntity(entity.AnimatedMovingEntity):
         An implementation class for the actual player.
         **internal class only!**
         """
-        sheet = entity.SpriteSheet(constants["player"], 3, 4, (32, 32))  # load the player sprite sheet.
+        sheet = entity.SpriteSheet.shared(constants["player"], 3, 4, (32, 32))  # load the player sprite sheet.
 
         # list the frame id's that corresponds
         left = [3, 4, 5, 4]
@@ -92,18 +92,22 @@ class PlayerEntity(entity.AnimatedMovingEntity):
 
 @game.OnReadyToLoadMap.redef
 def OnReadyToLoadMap(window: win.Window, game_: game.Game):
+    """
+    Load the city1 map in the background, showing a loading screen
+    until it is ready, then spawn the player in it.
+    """
+    def on_loaded(city1_map: map.MapTMX):
+        city1_map.register("city1/map", __name__)
+        game_.load_map(city1_map)
+
+        city1_map_spawn = city1_map.get_object_by_name("player_spawn")
+        player = PlayerEntity((city1_map_spawn.x, city1_map_spawn.y))
+        player.register("player", __name__)
+        city1_map.link_sprite(player, center=True)
 
     center_x = window.screen.get_size()[0] / 2
     center_y = window.screen.get_size()[1] / 2
-    city1_map = game_.new_map(constants["city1_map"], (center_x, center_y), 1)
-    city1_map.register("city1/map", __name__)
-    game_.load_map(city1_map)
-
-    city1_map_spawn = city1_map.get_object_by_name("player_spawn")
-    player = PlayerEntity((city1_map_spawn.x, city1_map_spawn.y))
-    player.register("player", __name__)
-    city1_map.link_sprite(player, center=True)
+    game_.status("frozen")
+    game_.new_map_async(constants["city1_map"], (center_x, center_y), 1, on_loaded)
 
     return 0
-
-
@@ -0,0 +1,187 @@
+import heapq
+from collections import OrderedDict, deque
+from typing import Iterable
+import pygame
+from tools import Coordinates, Direction
+import const
+
+
+# neighbours of a cell, as the direction to take to reach them and their offset in cells:
+_NEIGHBOURS: tuple[tuple[Direction, int, int], ...] = (("-left", -1, 0), ("-right", 1, 0), ("-up", 0, -1), ("-down", 0, 1))
+
+
+class NavGrid:
+    def __init__(self, columns: int, rows: int, cell_size: tuple[int, int], blocked: bytearray,
+                 cache_size: int = const.NAV_FIELD_CACHE):
+        """
+        A walkability grid of a map, with 'columns' x 'rows' cells of 'cell_size' pixels.
+        'blocked' holds one byte per cell, row by row, that is not 0 if the cell can't be walked on.
+
+        Paths between two points are found with A*, moving in the four directions
+        the entities can move in. Distance fields, that tell the way to a destination
+        from every cell of the map, are computed once per destination and shared by
+        all the NPCs going there. The 'cache_size' most recently used ones are kept.
+        """
+        self.columns = columns
+        self.rows = rows
+        self.cell_size = cell_size
+        self.blocked = blocked
+        self.cache_size = cache_size
+        self._fields: OrderedDict[tuple[int, ...], list[int]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_hitboxes(cls, hitboxes: Iterable[pygame.Rect], map_size: tuple[int, int],
+                      cell_size: tuple[int, int], agent_size: tuple[int, int] = (0, 0)) -> "NavGrid":
+        """
+        Rasterise 'hitboxes' into the grid of a map of 'map_size' pixels: a cell is blocked
+        if a hitbox covers it, even partly, or if a rectangle of 'agent_size' (the feet of
+        the entities that walk on the map) centered on the cell would touch a hitbox.
+        """
+        width, height = cell_size
+        columns = -(-map_size[0] // width)
+        rows = -(-map_size[1] // height)
+        blocked = bytearray(columns * rows)
+        grow_x, grow_y = max(agent_size[0] - width, 0), max(agent_size[1] - height, 0)
+        for rect in hitboxes:
+            rect = rect.inflate(grow_x, grow_y)
+            left, right = max(rect.left // width, 0), min((rect.right - 1) // width, columns - 1)
+            top, bottom = max(rect.top // height, 0), min((rect.bottom - 1) // height, rows - 1)
+            for y in range(top, bottom + 1):
+                row = y * columns
+                blocked[row + left:row + right + 1] = b"\x01" * (right - left + 1)
+        return cls(columns, rows, cell_size, blocked)
+
+    def cell_of(self, xy: Coordinates) -> int:
+        """
+        Return the index of the cell containing the point 'xy', or -1 if it is outside the grid.
+        """
+        x, y = int(xy[0] // self.cell_size[0]), int(xy[1] // self.cell_size[1])
+        if 0 <= x < self.columns and 0 <= y < self.rows:
+            return y * self.columns + x
+        return -1
+
+    def center_of(self, cell: int) -> Coordinates:
+        """
+        Return the point at the center of the cell 'cell'.
+        """
+        y, x = divmod(cell, self.columns)
+        width, height = self.cell_size
+        return x * width + width // 2, y * height + height // 2
+
+    def walkable(self, cell: int) -> bool:
+        return cell >= 0 and not self.blocked[cell]
+
+    def _neighbours(self, cell: int) -> Iterable[tuple[Direction, int]]:
+        """
+        Internal method that yields the walkable neighbours of 'cell', with the direction to reach them.
+        """
+        columns = self.columns
+        y, x = divmod(cell, columns)
+        blocked = self.blocked
+        for direction, dx, dy in _NEIGHBOURS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < columns and 0 <= ny < self.rows:
+                neighbour = ny * columns + nx
+                if not blocked[neighbour]:
+                    yield direction, neighbour
+
+    def find_path(self, start: Coordinates, goal: Coordinates) -> list[Coordinates] or None:
+        """
+        Return the centers of the cells to walk through to go from 'start' to 'goal'
+        (both excluded), or None if 'goal' can't be reached.
+        """
+        start_cell, goal_cell = self.cell_of(start), self.cell_of(goal)
+        if not (self.walkable(start_cell) and self.walkable(goal_cell)):
+            return None
+
+        columns = self.columns
+        goal_y, goal_x = divmod(goal_cell, columns)
+        came_from = {start_cell: -1}
+        costs = {start_cell: 0}
+        queue = [(0, start_cell)]
+        while queue:
+            priority, cell = heapq.heappop(queue)
+            if cell == goal_cell:
+                path = []
+                cell = came_from[cell]
+                while cell != start_cell:
+                    path.append(self.center_of(cell))
+                    cell = came_from[cell]
+                path.reverse()
+                return path
+
+            cost = costs[cell] + 1
+            for direction, neighbour in self._neighbours(cell):
+                if cost < costs.get(neighbour, cost + 1):
+                    costs[neighbour] = cost
+                    came_from[neighbour] = cell
+                    y, x = divmod(neighbour, columns)
+                    heapq.heappush(queue, (cost + abs(goal_x - x) + abs(goal_y - y), neighbour))
+        return None
+
+    def distance_field(self, goals: Iterable[Coordinates]) -> list[int]:
+        """
+        Return, for every cell, the amount of cells to walk through to reach the closest
+        of 'goals', or -1 if none can be reached from it. Fields are cached per set of goals.
+        """
+        key = tuple(sorted({cell for cell in map(self.cell_of, goals) if self.walkable(cell)}))
+        field = self._fields.get(key)
+        if field is not None:
+            self._fields.move_to_end(key)
+            self.hits += 1
+            return field
+
+        self.misses += 1
+        field = [-1] * (self.columns * self.rows)
+        queue = deque(key)
+        for cell in key:
+            field[cell] = 0
+        while queue:
+            cell = queue.popleft()
+            distance = field[cell] + 1
+            for direction, neighbour in self._neighbours(cell):
+                if field[neighbour] < 0:
+                    field[neighbour] = distance
+                    queue.append(neighbour)
+
+        self._fields[key] = field
+        if len(self._fields) > self.cache_size:
+            self._fields.popitem(last=False)
+        return field
+
+    def next_direction(self, position: Coordinates, goals: Iterable[Coordinates], tolerance: int = 0) -> Direction or None:
+        """
+        Return the direction to move in from 'position' to get closer to the closest of 'goals',
+        or None if 'position' is already in a goal's cell or if no goal can be reached from it.
+
+        Before leaving its cell, 'position' is brought back within 'tolerance' pixels of
+        the cell's center across the way it leaves, so that it does not cut corners.
+        """
+        field = self.distance_field(goals)
+        cell = self.cell_of(position)
+        if cell < 0 or field[cell] == 0:
+            return None
+        distance = field[cell]
+        if distance < 0:
+            # 'position' is off the walkable cells (e.g. against a wall): go back to the best one next to it.
+            reachable = [(field[neighbour], direction) for direction, neighbour in self._neighbours(cell) if field[neighbour] >= 0]
+            return min(reachable)[1] if reachable else None
+
+        for direction, neighbour in self._neighbours(cell):
+            if field[neighbour] == distance - 1:
+                center_x, center_y = self.center_of(cell)
+                if direction in ("-up", "-down"):
+                    offset = position[0] - center_x
+                    if abs(offset) > tolerance:
+                        return "-left" if offset > 0 else "-right"
+                else:
+                    offset = position[1] - center_y
+                    if abs(offset) > tolerance:
+                        return "-up" if offset > 0 else "-down"
+                return direction
+        return None
+
+    def clear_cache(self):
+        self._fields.clear()
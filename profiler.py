@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import nullcontext
+from os import PathLike
+from tools import FrameStats
+
+
+_DISABLED = nullcontext()
+
+
+class _Phase:
+    def __init__(self, profiler: "FrameProfiler", name: str):
+        """
+        A context manager timing one phase of a frame.
+        **internal class only!**
+        """
+        self._profiler = profiler
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._profiler.record(self._name, self._start, time.perf_counter() - self._start)
+        return False
+
+
+class FrameProfiler:
+    def __init__(self, capacity: int = 600):
+        """
+        Records how long each phase of the game's frames takes.
+
+        Use it as follows:
+
+            with profiler.phase("inputs"):
+                ...
+
+        The durations of the last 'capacity' occurrences of each phase are kept in
+        ring buffers. When the profiler is disabled (the default), self.phase() returns
+        a shared no-op context manager and nothing is recorded.
+        """
+        self.enabled = False
+        self.capacity = capacity
+        self._samples: dict[str, deque[float]] = {}
+        self._events: deque[tuple[str, float, float, int]] = deque(maxlen=capacity * 16)
+        self._origin = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """
+        Forget everything that was recorded so far.
+        """
+        self._samples.clear()
+        self._events.clear()
+
+    def phase(self, name: str):
+        """
+        Return a context manager timing the phase 'name'.
+        """
+        if not self.enabled:
+            return _DISABLED
+        return _Phase(self, name)
+
+    def record(self, name: str, start: float, duration: float):
+        """
+        Record that the phase 'name' started at 'start' (a time.perf_counter() value)
+        and lasted 'duration' seconds.
+        """
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self.capacity)
+        samples.append(duration)
+        self._events.append((name, start, duration, threading.get_ident()))
+
+    def phases(self) -> list[str]:
+        return list(self._samples)
+
+    def stats(self, name: str) -> FrameStats:
+        """
+        Return the timing statistics (including p50, p95 and p99) of the phase 'name'.
+        """
+        return FrameStats(self._samples.get(name, ()))
+
+    def summary(self) -> dict[str, FrameStats]:
+        return {name: self.stats(name) for name in self._samples}
+
+    def chrome_trace(self) -> dict:
+        """
+        Return the recorded phases in the Chrome trace event format.
+        """
+        pid = os.getpid()
+        events = []
+        for name, start, duration, tid in self._events:
+            events.append({
+                "name": name,
+                "cat": "frame",
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": duration * 1e6,
+                "pid": pid,
+                "tid": tid
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump_chrome_trace(self, path: str or PathLike):
+        """
+        Write the recorded phases to 'path', as a JSON file that can be opened
+        with chrome://tracing or Perfetto.
+        """
+        with open(path, "w") as file:
+            json.dump(self.chrome_trace(), file)
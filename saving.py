@@ -1,45 +1,360 @@
-from typing import Any
+import os
+import time
+import zlib
+import struct
+import threading
+from typing import NamedTuple
 from tools import Registry
-import pickle
+import logger
+import const
+
+
+MAGIC = b"KKSAVE"
+VERSION = 1
+
+FLAG_COMPRESSED = 1
+
+_HEADER = struct.Struct("<6sH4sHII")   # magic, version, section tag, flags, payload length, crc32 of the payload
+_COUNT = struct.Struct("<I")
+_NAME = struct.Struct("<H")
+_ENTITY = struct.Struct("<iiBHII")     # x, y, rotation, frameno, script step, script tick
+_MAP = struct.Struct("<?ddd")          # active, center x, center y, zoom
+
+_ROTATIONS = ("", "left", "right", "up", "down")
+
+
+class EntityState(NamedTuple):
+    """
+    The saved state of an entity: plain values only, no pygame objects.
+    """
+    x: int
+    y: int
+    rotation: str = ""
+    frameno: int = 1
+    step: int = 0
+    tick: int = 0
+
+    @classmethod
+    def of(cls, entity) -> "EntityState":
+        return cls(entity.rect.x, entity.rect.y, getattr(entity, "rotation", ""), getattr(entity, "frameno", 1),
+                   getattr(entity, "current_step", 0), getattr(entity, "current_tick", 0))
+
+    def apply(self, entity):
+        entity.rect.topleft = self.x, self.y
+        if hasattr(entity, "old_position"):
+            entity.old_position = self.x, self.y
+        if self.rotation and hasattr(entity, "rotation"):
+            entity.rotation = self.rotation
+        if hasattr(entity, "frameno"):
+            entity.frameno = self.frameno
+        if hasattr(entity, "current_step"):
+            entity.current_step = self.step
+            entity.current_tick = self.tick
+
+
+class MapState(NamedTuple):
+    """
+    The saved state of a map: whether it is the active one, and its camera.
+    """
+    active: bool
+    center: tuple[float, float]
+    zoom: float
+
+    @classmethod
+    def of(cls, map_) -> "MapState":
+        return cls(map_.active, tuple(map_.camera), map_.zoom)
+
+    def apply(self, map_):
+        map_.zoom = self.zoom
+        map_.center(self.center)
+
+
+def _encode_name(name: str) -> bytes:
+    name = name.encode("utf-8")
+    return _NAME.pack(len(name)) + name
+
+
+def _encode_entities(states: dict[str, EntityState]) -> bytes:
+    result = bytearray(_COUNT.pack(len(states)))
+    for name, state in states.items():
+        result += _encode_name(name)
+        result += _ENTITY.pack(state.x, state.y, _ROTATIONS.index(state.rotation), state.frameno, state.step, state.tick)
+    return bytes(result)
+
+
+def _encode_maps(states: dict[str, MapState]) -> bytes:
+    result = bytearray(_COUNT.pack(len(states)))
+    for name, state in states.items():
+        result += _encode_name(name)
+        result += _MAP.pack(state.active, *state.center, state.zoom)
+    return bytes(result)
+
+
+def _decode_records(payload: bytes, record: struct.Struct) -> list[tuple[str, tuple]]:
+    count, = _COUNT.unpack_from(payload, 0)
+    offset = _COUNT.size
+    result = []
+    for i in range(count):
+        length, = _NAME.unpack_from(payload, offset)
+        offset += _NAME.size
+        name = payload[offset:offset + length].decode("utf-8")
+        offset += length
+        result.append((name, record.unpack_from(payload, offset)))
+        offset += record.size
+    return result
+
+
+def _decode_entities(payload: bytes) -> dict[str, EntityState]:
+    result = {}
+    for name, (x, y, rotation, frameno, step, tick) in _decode_records(payload, _ENTITY):
+        result[name] = EntityState(x, y, _ROTATIONS[rotation], frameno, step, tick)
+    return result
+
+
+def _decode_maps(payload: bytes) -> dict[str, MapState]:
+    result = {}
+    for name, (active, x, y, zoom) in _decode_records(payload, _MAP):
+        result[name] = MapState(active, (x, y), zoom)
+    return result
+
+
+class _Section(NamedTuple):
+    tag: bytes
+    filename: str
+    encode: callable
+    decode: callable
+
+
+SECTIONS = {
+    "map": _Section(b"MAPS", "map.sav", _encode_maps, _decode_maps),
+    "entities": _Section(b"ENTS", "entities.sav", _encode_entities, _decode_entities),
+    "player": _Section(b"PLYR", "player.sav", _encode_entities, _decode_entities)
+}
+
+
+def encode_section(section: str, states: dict, compress=False) -> bytes:
+    """
+    Return the content of the save file of 'section' holding 'states'.
+    """
+    info = SECTIONS[section]
+    payload = info.encode(states)
+    crc = zlib.crc32(payload)
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload)
+        flags |= FLAG_COMPRESSED
+    return _HEADER.pack(MAGIC, VERSION, info.tag, flags, len(payload), crc) + payload
+
+
+def decode_section(section: str, content: bytes, file: str = "") -> dict:
+    """
+    Return the states held by 'content', the content of the save file of 'section'.
+    """
+    info = SECTIONS[section]
+    corrupted = ValueError(f"Corrupted save file '{file}'.")
+    try:
+        magic, version, tag, flags, length, crc = _HEADER.unpack_from(content, 0)
+    except struct.error:
+        raise corrupted from None
+    if magic != MAGIC or tag != info.tag:
+        raise corrupted
+    if version != VERSION:
+        raise ValueError(f"Unsupported save format version {version} in '{file}'.")
+    try:
+        payload = content[_HEADER.size:_HEADER.size + length]
+        if flags & FLAG_COMPRESSED:
+            payload = zlib.decompress(payload)
+        if zlib.crc32(payload) != crc:
+            raise corrupted
+        return info.decode(payload)
+    except (struct.error, zlib.error, UnicodeDecodeError, IndexError):
+        raise corrupted from None
 
 
 class Data:
     def __init__(self, player: Registry, ERegistry: Registry, MapStatus: Registry):
+        """
+        Saves and restores the state of the player, entities and maps registries.
+
+        Each registry is saved in its own section file in a versioned binary format,
+        holding plain values only (positions, rotation, animation frame, script step,
+        camera...). Sections whose content did not change since they were last
+        written by this object are not written again.
+        """
         self.player = player
         self.entities = ERegistry
         self.map = MapStatus
+        self._written: dict[tuple[str, str], int] = {}
+
+    @staticmethod
+    def _entity_states(reg: Registry) -> dict[str, EntityState]:
+        result = {}
+        for name, value in reg:
+            if hasattr(value, "rect"):
+                result[name] = EntityState.of(value)
+            else:
+                logger.RenderThreadWarn.log(f"Can't save '{name}': it is not an entity.")
+        return result
+
+    def snapshot(self) -> dict[str, dict]:
+        """
+        Return the current state of every section, as plain immutable values.
+        """
+        return {
+            "map": {name: MapState.of(value) for name, value in self.map},
+            "entities": self._entity_states(self.entities),
+            "player": self._entity_states(self.player)
+        }
 
-    def save(self, directory):
-        with open(directory + "/map.txt", mode="w+") as text_io:
-            pickle.dump(self.map, text_io)
-        with open(directory + "/entities.txt", mode="w+") as text_io:
-            pickle.dump(self.entities, text_io)
-        with open(directory + "/player.txt", mode="w+") as text_io:
-            pickle.dump(self.player, text_io)
+    def save(self, directory, sections: list[str] = None, snapshot: dict[str, dict] = None):
+        """
+        Save the sections 'sections' (all of them by default) into 'directory'.
+        Only the sections that changed since they were last saved are written.
+        """
+        if snapshot is None:
+            snapshot = self.snapshot()
+        for section in sections or SECTIONS:
+            content = encode_section(section, snapshot[section])
+            self.write_section(directory, section, content)
+
+    def write_section(self, directory, section: str, content: bytes, sync=False) -> bool:
+        """
+        Write 'content' to the file of 'section' in 'directory', atomically, unless it is
+        what was last written there. Return True if the file was written.
+        """
+        key = directory, section
+        digest = hash(content)
+        if self._written.get(key) == digest:
+            return False
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, SECTIONS[section].filename)
+        with open(path + ".tmp", "wb") as file:
+            file.write(content)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+        self._written[key] = digest
+        return True
 
     @classmethod
     def load(cls, directory):
-
-        map_ = cls._openload(directory + "/map.txt")
-        entities = cls._openload(directory + "/entities.txt")
-        player = cls._openload(directory + "/player.txt")
+        """
+        Return the states saved in 'directory', as dicts of registry names to
+        MapState or EntityState, in the order map, entities, player.
+        """
+        map_ = cls._openload(directory, "map")
+        entities = cls._openload(directory, "entities")
+        player = cls._openload(directory, "player")
         return map_, entities, player
 
+    def restore(self, directory, game=None):
+        """
+        Apply the states saved in 'directory' to the registries of self.
+        Registry names that no longer exist are ignored. If 'game' is given,
+        the map that was active is loaded.
+        """
+        map_, entities, player = self.load(directory)
+        for states, reg in ((map_, self.map), (entities, self.entities), (player, self.player)):
+            for name, state in states.items():
+                if name in reg:
+                    state.apply(reg[name])
+        if game is not None:
+            for name, state in map_.items():
+                if state.active and name in self.map:
+                    game.load_map(self.map[name])
+
     @staticmethod
-    def _openload(file):
+    def _openload(directory, section: str):
+        file = os.path.join(directory, SECTIONS[section].filename)
         try:
-            text_io = open(file, "r+")
+            with open(file, "rb") as binary_io:
+                content = binary_io.read()
         except FileNotFoundError:
             raise FileNotFoundError(f"Unknown file or directory '{file}'.")
-        try:
-            result = pickle.load(text_io)
-        except pickle.UnpicklingError:
-            raise ValueError("Object can't be saved correctly.")
-        finally:
-            text_io.close()
+        return decode_section(section, content, file)
 
-        return result
 
+class Autosave:
+    def __init__(self, data: Data, directory, interval: float = const.AUTOSAVE_INTERVAL, compress=True):
+        """
+        Saves 'data' into 'directory' every 'interval' seconds without blocking the main loop.
+
+        Only a snapshot of the registries is taken on the main thread (see self.last_snapshot_time).
+        Encoding, compression, writing and fsync happen on a background writer thread, and
+        every section file is replaced atomically. If a new snapshot is taken while the writer
+        is still busy, only the most recent pending one is written.
+        """
+        self.data = data
+        self.directory = directory
+        self.interval = interval
+        self.compress = compress
+        self.last_snapshot_time = 0.0
+        self.last_write_time = 0.0
+        self.saves = 0
+        self._last_save = time.perf_counter()
+        self._pending: dict[str, dict] or None = None
+        self._busy = False
+        self._running = True
+        self._condition = threading.Condition()
+        self._writer = threading.Thread(target=self._write_loop, name="Autosave-Thread", daemon=True)
+        self._writer.start()
+
+    def tick(self):
+        """
+        Save if the interval elapsed since the last save. Meant to be called once per frame.
+        """
+        if time.perf_counter() - self._last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        """
+        Snapshot the registries now, and hand the snapshot to the writer thread.
+        """
+        start = time.perf_counter()
+        snapshot = self.data.snapshot()
+        self._last_save = time.perf_counter()
+        self.last_snapshot_time = self._last_save - start
+        with self._condition:
+            self._pending = snapshot
+            self._condition.notify()
+        logger.RenderThreadInfo.log(f"Autosaving (snapshot took {self.last_snapshot_time * 1000:.3f}ms)...")
 
+    def _write_loop(self):
+        while True:
+            with self._condition:
+                while self._pending is None and self._running:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                snapshot, self._pending = self._pending, None
+                self._busy = True
+            start = time.perf_counter()
+            try:
+                for section in SECTIONS:
+                    content = encode_section(section, snapshot[section], self.compress)
+                    self.data.write_section(self.directory, section, content, sync=True)
+                self.saves += 1
+            except OSError as error:
+                logger.RenderThreadError.log(f"Autosave to '{self.directory}' failed: {error}.")
+            self.last_write_time = time.perf_counter() - start
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
 
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until every snapshot taken so far is written. Return False on timeout.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending is None and not self._busy, timeout)
 
+    def stop(self):
+        """
+        Write the pending snapshot, if any, and stop the writer thread.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._writer.join()
@@ -0,0 +1,103 @@
+import time
+import queue
+import threading
+from typing import NamedTuple
+import pygame
+import const
+import map
+import gui
+
+
+class RenderSnapshot(NamedTuple):
+    """
+    Everything needed to draw a frame: the game's status, the time (a time.perf_counter()
+    value) the last simulation step stands for, the active maps with the states of
+    their last two steps, the active menus with their last state, and the progress of
+    the maps being loaded (None if there are none). Drawing a snapshot only reads these states, never the live entities or widgets.
+    """
+    status: str
+    time: float
+    maps: tuple[tuple["map.MapTMX", "map.FrameState" or None, "map.FrameState" or None], ...]
+    menus: tuple[tuple["gui.GUI", "gui.MenuState" or None], ...]
+    loading: float or None
+
+
+class SimulationThread:
+    def __init__(self, game):
+        """
+        Runs the simulation of 'game' (event handlers, entity updates, collisions,
+        map loads and triggers) on its own thread, at const.SIM_TICK_RATE steps per
+        second, while the main thread only pumps pygame's events and draws.
+
+        After each step, a RenderSnapshot is published in self.snapshot, that the main
+        thread draws without waiting for the simulation. Code that changes the game's
+        state from another thread must hold self.lock while doing so.
+        """
+        self.game = game
+        self.lock = threading.RLock()
+        self.snapshot: RenderSnapshot or None = None
+        self._events: queue.SimpleQueue[pygame.event.Event] = queue.SimpleQueue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="Simulation-Thread", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def post(self, event: pygame.event.Event):
+        """
+        Hand 'event' to the simulation thread, that dispatches it before its next step.
+        """
+        self._events.put(event)
+
+    def is_current(self) -> bool:
+        """
+        Whether the calling thread is the simulation thread.
+        """
+        return threading.current_thread() is self._thread
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def stop(self):
+        """
+        Stop the simulation after its current step, and wait for it unless called from it.
+        """
+        self._stopped.set()
+        if self._thread.is_alive() and not self.is_current():
+            self._thread.join()
+
+    def _dispatch_events(self):
+        """
+        Internal method that dispatches the events posted since the last step.
+        """
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                return
+            self.game.dispatch_event(event)
+
+    def _run(self):
+        game = self.game
+        dt = game.sim_dt
+        next_step = time.perf_counter()
+        while not self._stopped.is_set():
+            now = time.perf_counter()
+            if now < next_step:
+                self._stopped.wait(next_step - now)
+                continue
+
+            with self.lock, game.profiler.phase("simulation"):
+                self._dispatch_events()
+                steps = 0
+                while next_step <= now and steps < const.MAX_SIM_STEPS:
+                    game.simulate()
+                    next_step += dt
+                    steps += 1
+                last_step = next_step - dt
+                if next_step <= now:
+                    # drop the time the simulation could not catch up with:
+                    next_step = now
+                game.update_logic()
+                self.snapshot = game.capture(last_step)
@@ -0,0 +1,130 @@
+import pygame
+from typing import Iterable
+
+
+class SpatialHash:
+    def __init__(self, rects: Iterable[pygame.Rect], cell_size: int = 64):
+        """
+        A uniform grid that indexes static rectangles by the cells they cover.
+
+        Built once from a list of rectangles (e.g. a map's collision hitboxes),
+        it only tests a query rectangle against the rectangles that share a
+        cell with it, instead of against all of them.
+        """
+        self.cell_size = cell_size
+        self.rects: list[pygame.Rect] = []
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        for rect in rects:
+            self.insert(rect)
+
+    def _cell_range(self, rect: pygame.Rect) -> tuple[range, range]:
+        """
+        Internal method that returns the ranges of cell columns and rows covered by 'rect'.
+        """
+        size = self.cell_size
+        return (range(rect.left // size, (rect.right - 1) // size + 1),
+                range(rect.top // size, (rect.bottom - 1) // size + 1))
+
+    def insert(self, rect: pygame.Rect):
+        """
+        Add 'rect' to the index.
+        """
+        index = len(self.rects)
+        self.rects.append(rect)
+        columns, rows = self._cell_range(rect)
+        for x in columns:
+            for y in rows:
+                self._cells.setdefault((x, y), []).append(index)
+
+    def candidates(self, rect: pygame.Rect) -> set[int]:
+        """
+        Return the indices of the rectangles that share at least one cell with 'rect'.
+        """
+        result = set()
+        cells = self._cells
+        columns, rows = self._cell_range(rect)
+        for x in columns:
+            for y in rows:
+                cell = cells.get((x, y))
+                if cell is not None:
+                    result.update(cell)
+        return result
+
+    def query(self, rect: pygame.Rect) -> list[pygame.Rect]:
+        """
+        Return all the indexed rectangles colliding with 'rect'.
+        """
+        return [self.rects[i] for i in self.candidates(rect) if rect.colliderect(self.rects[i])]
+
+    def collides(self, rect: pygame.Rect) -> bool:
+        """
+        Return True if 'rect' collides with at least one of the indexed rectangles.
+        """
+        rects = self.rects
+        for i in self.candidates(rect):
+            if rect.colliderect(rects[i]):
+                return True
+        return False
+
+    def __len__(self):
+        return len(self.rects)
+
+
+class SweepAndPrune:
+    def __init__(self, rect_of: callable):
+        """
+        Finds the pairs of overlapping rectangles among a set of moving objects.
+        'rect_of' is called with an object and returns its current rectangle.
+
+        The objects are kept sorted by the left side of their rectangle from one call of
+        self.pairs() to the next. Since they only move a little in between, the order is
+        almost sorted already and repairing it is close to linear. The sweep then only
+        tests objects whose rectangles overlap on the x axis, instead of every pair.
+        """
+        self.rect_of = rect_of
+        self._items: list = []
+
+    def add(self, item):
+        """
+        Add 'item' to the set.
+        """
+        self._items.append(item)
+
+    def remove(self, item):
+        """
+        Remove 'item' from the set.
+        """
+        self._items.remove(item)
+
+    def retain(self, items):
+        """
+        Remove from the set every object that is not in 'items'.
+        """
+        self._items = [item for item in self._items if item in items]
+
+    def pairs(self) -> list[tuple]:
+        """
+        Return the pairs of objects whose rectangles currently collide.
+        """
+        rect_of = self.rect_of
+        items = self._items
+        # list.sort() finds the runs of an almost sorted list, so this stays incremental:
+        items.sort(key=lambda item: rect_of(item).left)
+
+        result = []
+        active = []
+        for item in items:
+            rect = rect_of(item)
+            left = rect.left
+            active = [entry for entry in active if entry[0] > left]
+            for right, other, other_rect in active:
+                if rect.colliderect(other_rect):
+                    result.append((other, item))
+            active.append((rect.right, item, rect))
+        return result
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
@@ -0,0 +1,61 @@
+import time
+from contextlib import contextmanager
+
+_ORIGIN = time.perf_counter()
+
+
+class StartupProfile:
+    def __init__(self, origin: float):
+        """
+        Records where the game's startup time goes: the duration of its phases
+        (e.g. heavy imports) and the time at which milestones (window opened,
+        main menu ready, first frame presented) are reached, relative to 'origin'.
+        """
+        self.origin = origin
+        self.budget: float or None = None
+        self.phases: dict[str, float] = {}
+        self.marks: dict[str, float] = {}
+        self.reported = False
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time the code run in the 'with' block as the startup phase 'name'.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def mark(self, name: str):
+        """
+        Record that the milestone 'name' was reached now. Only the first time counts.
+        """
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.origin
+
+    def over_budget(self) -> bool:
+        """
+        Whether the first frame was presented later than the budget allows.
+        """
+        return self.budget is not None and self.marks.get("first_frame", 0.0) > self.budget
+
+    def report(self):
+        """
+        Log the startup time breakdown, and warn if the first frame came later than the budget.
+        """
+        import logger
+
+        self.reported = True
+        for name, duration in sorted(self.phases.items(), key=lambda item: item[1], reverse=True):
+            logger.RenderThreadInfo.log(f"Startup phase '{name}' took {duration * 1000:.1f}ms.")
+        for name, moment in sorted(self.marks.items(), key=lambda item: item[1]):
+            logger.RenderThreadInfo.log(f"Time to {name.replace('_', ' ')}: {moment * 1000:.1f}ms.")
+        if self.over_budget():
+            logger.RenderThreadWarn.log(f"Time to first frame ({self.marks['first_frame'] * 1000:.1f}ms) "
+                                        f"is over the startup budget ({self.budget * 1000:.1f}ms)!")
+
+
+profile = StartupProfile(_ORIGIN)
+"""The startup profile of the running game. Import this module first to measure everything."""
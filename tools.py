@@ -13,45 +13,143 @@ Action = Union[Direction, _Say]
 RGBColor = tuple[int, int, int]
 
 
+def percentile(sorted_values: list[float], q: float) -> float:
+    """
+    Return the 'q' -th percentile (0 <= q <= 100) of 'sorted_values', which must be sorted.
+    Uses linear interpolation between the closest ranks.
+    """
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class FrameStats:
+    def __init__(self, frame_times: list[float]):
+        """
+        Timing statistics of a series of frames, 'frame_times' being
+        the duration of each frame in seconds.
+        """
+        self.frame_times = list(frame_times)
+        ordered = sorted(self.frame_times)
+        self.count = len(ordered)
+        self.total = sum(ordered)
+        self.mean = self.total / self.count if self.count else 0.0
+        self.min = ordered[0] if ordered else 0.0
+        self.max = ordered[-1] if ordered else 0.0
+        self.p50 = percentile(ordered, 50)
+        self.p95 = percentile(ordered, 95)
+        self.p99 = percentile(ordered, 99)
+
+    @property
+    def fps(self) -> float:
+        return 1 / self.mean if self.mean else 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "frames": self.count,
+            "total": self.total,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.p50,
+            "p95": self.p95,
+            "p99": self.p99,
+            "fps": self.fps
+        }
+
+    def __str__(self):
+        return (f"{self.count} frames in {self.total:.3f}s: mean {self.mean * 1000:.3f}ms ({self.fps:.1f} FPS), "
+                f"min {self.min * 1000:.3f}ms, p50 {self.p50 * 1000:.3f}ms, p95 {self.p95 * 1000:.3f}ms, "
+                f"p99 {self.p99 * 1000:.3f}ms, max {self.max * 1000:.3f}ms")
+
+
 class Registry:
     Type = object
 
     def __init__(self, type_: type):
+        """
+        An ordered, name-keyed collection of objects of type 'type_'.
+
+        Values are stored in self.dict, and an ordered index of their names is kept
+        alongside it so that positional access and len() are O(1).
+        Iterating yields (name, value) tuples from a snapshot of the registry, so
+        every iteration is independent from the others and may safely be nested.
+        """
         self.dict = {}
         self.Type = type_
-        self._iter_count = 0
+        self._keys: list[str] = []
+        self._generation = 0
+        self._snapshot: tuple[tuple[str, Any], ...] = ()
+        self._snapshot_generation = 0
+
+    @property
+    def generation(self) -> int:
+        """
+        A counter that is incremented every time the content of the registry changes.
+        Compare it to a previously stored value to know if a cache built from
+        this registry must be invalidated.
+        """
+        return self._generation
 
     def __getitem__(self, item: str or int):
         if isinstance(item, str):
             return self.dict[item]
-        to_count = self._to_list()
-        k, v = to_count[item]
-        return v
+        return self.dict[self._keys[item]]
+
+    def __contains__(self, item: str):
+        return item in self.dict
 
     def __len__(self):
-        to_count = self._to_list()
-        return len(to_count)
+        return len(self._keys)
 
     def __iter__(self):
-        self._iter_count = 0
-        return self
-
-    def __next__(self) -> tuple[str, Any]:
-        if self._iter_count >= len(self):
-            raise StopIteration
-        to_iter = self._to_list()
-        result = to_iter[self._iter_count]
-        self._iter_count += 1
-        return result
-
-    def _to_list(self) -> list[tuple[str, Any]]:
-        result: list[tuple[str, Any]] = []
-        for item in self.dict:
-            result.append((item, self.dict[item]))
-        return result
+        return iter(self.items())
+
+    def items(self) -> tuple[tuple[str, Any], ...]:
+        """
+        Return a snapshot of the registry's (name, value) pairs, in registration order.
+        The snapshot is only rebuilt when the registry changed since the last call.
+        """
+        if self._snapshot_generation != self._generation:
+            self._snapshot = tuple((key, self.dict[key]) for key in self._keys)
+            self._snapshot_generation = self._generation
+        return self._snapshot
+
+    def keys(self) -> list[str]:
+        return list(self._keys)
+
+    def values(self) -> list[Any]:
+        return [value for key, value in self.items()]
+
+    def index(self, name: str) -> int:
+        """
+        Return the position of 'name' in the registry.
+        """
+        try:
+            return self._keys.index(name)
+        except ValueError:
+            raise KeyError(name) from None
 
     def register(self, name: str, value):
         if not isinstance(value, self.Type):
             raise TypeError(f"Incorrect type for provided argument 'value'. Expected type {self.Type}, got {type(value)} instead.")
+        if name in self.dict:
+            if self.dict[name] is value:
+                return
+        else:
+            self._keys.append(name)
         self.dict[name] = value
+        self._generation += 1
 
+    def unregister(self, name: str):
+        """
+        Remove 'name' from the registry.
+        """
+        if name not in self.dict:
+            raise KeyError(f"Unknown registry name '{name}'.")
+        del self.dict[name]
+        self._keys.remove(name)
+        self._generation += 1
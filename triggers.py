@@ -1,35 +1,101 @@
 import sys
+import traceback
 import logger
 from pyerror_display import PyError
 
 
 class Trigger:
-    def __init__(self, func: callable):
+    def __init__(self, func: callable, noop_default: bool = False):
         """
         Triggers are sort of events that are usually called
         by the game itself. By default they do nothing, but you can
         override them as you want.
         Multiple overrides will cumulate and each of them will be executed
-        when the trigger is called.
+        when the trigger is called, along with 'func', the default action.
+        If 'noop_default' is set, 'func' is known to do nothing but return 0,
+        and is not called anymore once the trigger is overridden.
 
         This class is usually used as a function decorator. See game.py
         and base_mod.py for some examples.
         """
         self._file = self.__module__
         self.callables = {"__main__": func}
+        self._default = func
+        self.noop_default = noop_default
+        self._dispatch: tuple[tuple[str, callable], ...] = ()
+        self._single = None
+        self._pending: list[callable] = []
+        self._compile()
+
+    def _compile(self):
+        """
+        Internal method that rebuilds the flat dispatch tuple of the trigger from self.callables,
+        leaving a no-op default action out once the trigger is overridden. When there is only
+        one handler to call, it is also stored in self._single, so that self.fire() calls it
+        directly. Called every time the trigger is redefined.
+        """
+        dispatch = tuple(self.callables.items())
+        if self.noop_default:
+            dispatch = tuple((name, func) for name, func in dispatch if func is not self._default) or dispatch
+        self._dispatch = dispatch
+        self._single = dispatch[0] if len(dispatch) == 1 else None
+
+    @classmethod
+    def noop(cls, func: callable) -> "Trigger":
+        """
+        Same as Trigger(func, noop_default=True), to be used as a function decorator
+        on triggers whose default action only returns 0.
+        """
+        return cls(func, noop_default=True)
+
+    @property
+    def overridden(self) -> bool:
+        """
+        Whether at least one mod redefined the trigger, or will when it is first called.
+        """
+        return any(func is not self._default for func in self.callables.values()) or bool(self._pending)
+
+    def defer(self, loader: callable):
+        """
+        Call 'loader' the first time the trigger is called, before dispatching.
+        Used to import mods that override the trigger only when it is first needed.
+        """
+        self._pending.append(loader)
+
+    def _load_pending(self):
+        """
+        Internal method that runs the deferred loaders of the trigger.
+        """
+        pending, self._pending = self._pending, []
+        for loader in pending:
+            try:
+                loader()
+            except:
+                etype, evalue, tb = sys.exc_info()
+                PyError(etype, evalue, tb, traceback.extract_tb(tb)[-1].filename)
+
+    def _fail(self, name: str, func: callable):
+        """
+        Internal method called when the override 'func' of the mod 'name' signified an error.
+        """
+        logger.RenderThreadError.log(f'Error in trigger at line {func.__code__.co_firstlineno} of file '
+                                     f"{func.__code__.co_filename}, mod '{self._file}' raised an error.")
+        logger.crash(reason=f"Error raised by mod '{name}'")
 
     def __call__(self, *args, **kwargs):
         """
         Implement self(*args, **kwargs).
         Calls the actual trigger with possible return values.
         """
+        if self._pending:
+            self._load_pending()
         return_ = []
-        for _callable in self.callables:
+        for name, func in self._dispatch:
             result = None
             try:
-                result = self.callables[_callable](*args, **kwargs)
+                result = func(*args, **kwargs)
             except:
-                PyError(*sys.exc_info(), self.callables[_callable].__code__.co_filename)
+                PyError(*sys.exc_info(), func.__code__.co_filename)
 
             # assert result is not None
             if isinstance(result, tuple):
@@ -38,12 +104,38 @@ class Trigger:
                 errorlevel = result
 
             if errorlevel == 1:
-                logger.RenderThreadError.log(f'Error in trigger at line {self.callables[_callable].__code__.co_firstlineno} of file '
-                                             f"{self.callables[_callable].__code__.co_filename}, mod '{self._file}' raised an error.")
-                logger.crash(reason=f"Error raised by mod '{_callable}'")
+                self._fail(name, func)
             return_.append(result)
         return return_
 
+    def fire(self, *args, **kwargs):
+        """
+        Call the trigger like self(*args, **kwargs) does, but without collecting
+        the return values. Use it when the caller ignores them.
+        """
+        if self._pending:
+            self._load_pending()
+        single = self._single
+        if single is not None:
+            name, func = single
+            try:
+                result = func(*args, **kwargs)
+            except:
+                PyError(*sys.exc_info(), func.__code__.co_filename)
+                return
+            if result == 1 or (type(result) is tuple and result and result[0] == 1):
+                self._fail(name, func)
+            return
+
+        for name, func in self._dispatch:
+            try:
+                result = func(*args, **kwargs)
+            except:
+                PyError(*sys.exc_info(), func.__code__.co_filename)
+                continue
+            if result == 1 or (type(result) is tuple and result and result[0] == 1):
+                self._fail(name, func)
+
     def redef(self, func: callable):
         """
         Redefine/override the trigger's action, the things it will do when called.
@@ -59,3 +151,4 @@ class Trigger:
         In most cases, this method should be used as a function decorator.
         """
         self.callables[func.__module__] = func
+        self._compile()
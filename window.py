@@ -2,9 +2,56 @@ import pygame
 from os import PathLike
 
 
+class FrameCompositor:
+    def __init__(self, use_dirty_rects=False):
+        """
+        Collects what has been drawn to the screen during a frame, and presents
+        it to the display exactly once, at the end of the frame.
+
+        Components that draw to the whole screen call self.invalidate(), while
+        components that only redraw some areas can report them with self.add_dirty().
+        If 'use_dirty_rects' is set, frames where only some areas changed are
+        presented with pygame.display.update(dirty_rects) instead of a full flip.
+        """
+        self.use_dirty_rects = use_dirty_rects
+        self._dirty_rects: list[pygame.Rect] = []
+        self._full = False
+        self.presented_frames = 0
+
+    def invalidate(self):
+        """
+        Mark the whole screen as changed for this frame.
+        """
+        self._full = True
+
+    def add_dirty(self, *rects: pygame.Rect):
+        """
+        Mark the areas 'rects' of the screen as changed for this frame.
+        """
+        self._dirty_rects.extend(rects)
+
+    @property
+    def dirty(self) -> bool:
+        return self._full or bool(self._dirty_rects)
+
+    def present(self):
+        """
+        Present the frame to the display, if anything changed, and start a new one.
+        """
+        if self._full or (self._dirty_rects and not self.use_dirty_rects):
+            pygame.display.flip()
+            self.presented_frames += 1
+        elif self._dirty_rects:
+            pygame.display.update(self._dirty_rects)
+            self.presented_frames += 1
+        self._full = False
+        self._dirty_rects = []
+
+
 class Window:
     def __init__(self, default_title: str):
         self.screen = pygame.display.set_mode((720, 480))
+        self.compositor = FrameCompositor(use_dirty_rects=True)
         self.title(default_title)
 
     @staticmethod